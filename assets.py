@@ -0,0 +1,105 @@
+'''
+Assets graphs draw that do not come from the conversation: fonts and sticker images
+
+Both are loaded once per process, so batch runs and the server, which draw
+many threads in one process, do not load them again for every graph. Stickers
+are also shrunk once and kept in ASSET_CACHE_FOLDER between runs, except by
+the server, which only reads them from there
+'''
+
+import os
+import hashlib
+
+import config
+
+# font folders already added to matplotlib by this process
+_font_folders = set()
+
+# shrunk sticker images by (path, modification time, size, pixels)
+_stickers = {}
+
+# whether shrunk stickers are saved in ASSET_CACHE_FOLDER, turned off by
+# server.py, which never writes to my_data and keeps them in memory only
+save_stickers = True
+
+FONT_EXTENSIONS = ('.ttf', '.otf', '.ttc')
+
+def font_files(folder=config.FONT_FOLDER):
+    '''
+    Returns the font files in folder and its subfolders, sorted
+    '''
+    return sorted(
+        os.path.join(root, name)
+        for root, subfolders, names in os.walk(folder)
+        for name in names
+        if name.lower().endswith(FONT_EXTENSIONS)
+    )
+
+def file_stats(paths):
+    '''
+    Returns the path, modification time and size of each file, with None for
+    missing files, for hashing the assets a graph draws
+    '''
+    stats = list()
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stats.append([path, stat.st_mtime_ns, stat.st_size])
+        except OSError:
+            stats.append([path, None, None])
+    return stats
+
+def register_fonts(folder=config.FONT_FOLDER):
+    '''
+    Adds the fonts in folder to matplotlib once per process, so graphs can
+    use them by name
+    '''
+    if folder in _font_folders:
+        return
+    from matplotlib import font_manager
+    for font_file in font_files(folder):
+        font_manager.fontManager.addfont(font_file)
+    _font_folders.add(folder)
+
+def shrink_image(path, pixels):
+    '''
+    Returns an image as an RGBA array, shrunk to fit in a square of pixels
+    '''
+    import numpy as np
+    from PIL import Image
+    with Image.open(path) as image:
+        image = image.convert('RGBA')
+        image.thumbnail((pixels, pixels), Image.LANCZOS)
+        return np.asarray(image)
+
+def sticker_image(path, pixels=None):
+    '''
+    Returns a sticker as an RGBA array that fits in a square of pixels, by
+    default config.STICKER_PIXELS, shrinking it only the first time it is used
+    at that size since it last changed
+
+    Raises FileNotFoundError if the sticker is not in the Facebook data
+    '''
+    import numpy as np
+    pixels = pixels or config.STICKER_PIXELS
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, pixels)
+    if key in _stickers:
+        return _stickers[key]
+
+    name = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+    cache_folder = os.path.join(config.ASSET_CACHE_FOLDER, "{}px".format(pixels))
+    cached_file = os.path.join(cache_folder, "{}.npy".format(name))
+    try:
+        image = np.load(cached_file)
+    except (OSError, ValueError):
+        image = shrink_image(path, pixels)
+        if save_stickers:
+            os.makedirs(cache_folder, exist_ok=True)
+            # saved under another name and renamed, as batch workers may shrink the same sticker at once
+            temporary = "{}.{}.npy".format(cached_file[:-len(".npy")], os.getpid())
+            np.save(temporary, image)
+            os.replace(temporary, cached_file)
+
+    _stickers[key] = image
+    return image
@@ -0,0 +1,193 @@
+'''
+Graphs every conversation in a Facebook messages folder in one run
+
+Usage: python3 batch.py <inbox_folder>
+
+--list and --export-stats only read the index of the last run, so they do not
+import pandas or matplotlib and return straight away
+'''
+
+import os
+import sys
+import csv
+import json
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import config
+import corpus
+import loader
+import sinks
+
+INDEX_FILE = "my_data/index.json"
+
+def graph_thread(chat_folder, use_cache, incremental, graph_format, archive):
+    '''
+    Graphs one thread in a worker, returning its summary, or the error it
+    raised, or that it has no messages
+    '''
+    # imported here so each worker pays for the plotting imports once
+    import chatstats
+
+    try:
+        # threads already run in parallel, so each one uses a single process
+        return chatstats.graph_thread(
+            chat_folder,
+            use_cache=use_cache,
+            incremental=incremental,
+            ingest_jobs=1,
+            render_jobs=1,
+            graph_format=graph_format,
+            archive=archive,
+            statistics=True
+        )
+    except loader.EmptyThread:
+        return {
+            'thread_path': loader.thread_path(chat_folder),
+            'empty': True,
+        }
+    except Exception:
+        return {
+            'thread_path': loader.thread_path(chat_folder),
+            'error': traceback.format_exc(),
+        }
+
+def write_index(summaries):
+    '''
+    Saves a summary of every graphed thread, largest first
+    '''
+    summaries = sorted(summaries, key=lambda s: (-s.get('messages', 0), s['thread_path']))
+    folder = os.path.dirname(INDEX_FILE)
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    with open(INDEX_FILE, 'w') as f:
+        json.dump(summaries, f, indent=2)
+
+def read_index():
+    '''
+    Returns the thread summaries saved by the last batch run
+    '''
+    try:
+        with open(INDEX_FILE) as f:
+            return json.load(f)
+    except OSError:
+        print("No index found in {}, run batch.py on your inbox first".format(INDEX_FILE))
+        sys.exit(1)
+
+def list_threads():
+    for summary in read_index():
+        if 'error' in summary:
+            print("{:>10}  {}  (failed)".format("", summary['thread_path']))
+            continue
+        if 'empty' in summary:
+            print("{:>10}  {}  (empty)".format(0, summary['thread_path']))
+            continue
+        print("{:>10}  {}  {} to {}".format(
+            summary['messages'], summary['thread_path'], summary['first_message'], summary['last_message']
+        ))
+
+def export_stats(path):
+    '''
+    Writes one csv row per indexed thread
+    '''
+    columns = ['thread_path', 'messages', 'words', 'senders', 'first_message', 'last_message', 'output_folder']
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        for summary in read_index():
+            if 'error' in summary or 'empty' in summary:
+                continue
+            writer.writerow(dict(summary, senders="; ".join(summary['senders'])))
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog=argv[0], description="Graph every conversation in a Facebook messages folder")
+    parser.add_argument('inbox_folder', nargs='?', help="folder containing your conversations, e.g. messages/inbox")
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=config.BATCH_WORKERS,
+        help="number of conversations graphed at once (default: one per CPU)"
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help="reprocess conversations even if they have not changed since the last run"
+    )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help="only process messages newer than the last run, for exports that only add messages"
+    )
+    parser.add_argument(
+        '--format',
+        default=config.GRAPH_FORMAT,
+        choices=sorted(sinks.FORMATS),
+        help="save graphs as png or svg images, or as json of the data each graph plots"
+    )
+    parser.add_argument(
+        '--zip',
+        action='store_true',
+        default=config.ARCHIVE_GRAPHS,
+        help="save each conversation's graphs in one {} instead of a file per graph".format(sinks.ARCHIVE_FILE)
+    )
+    parser.add_argument(
+        '--list',
+        action='store_true',
+        help="list the conversations graphed by the last run, largest first"
+    )
+    parser.add_argument(
+        '--export-stats',
+        metavar='CSV_FILE',
+        help="save the statistics of every conversation graphed by the last run to a csv file"
+    )
+    args = parser.parse_args(argv[1:])
+    if args.inbox_folder is None and not args.list and args.export_stats is None:
+        parser.error("the inbox_folder argument is required")
+    return args
+
+def main(argv):
+    args = parse_args(argv)
+    if args.list or args.export_stats is not None:
+        if args.list:
+            list_threads()
+        if args.export_stats is not None:
+            export_stats(args.export_stats)
+            print("Statistics saved in {}".format(args.export_stats))
+        return
+
+    threads = loader.find_threads(args.inbox_folder)
+    if len(threads) == 0:
+        print("No conversations found in {}".format(args.inbox_folder))
+        sys.exit(1)
+
+    print("Plotting graphs for {} conversations...".format(len(threads)))
+
+    summaries = list()
+    workers = min(args.jobs or os.cpu_count() or 1, len(threads))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(graph_thread, chat_folder, not args.no_cache, args.incremental, args.format, args.zip)
+            for chat_folder in threads
+        ]
+        for i, future in enumerate(futures):
+            summary = future.result()
+            summaries.append(summary)
+            status = "failed" if 'error' in summary else "empty" if 'empty' in summary else "done"
+            print("[{}/{}] {} {}".format(i + 1, len(threads), summary['thread_path'], status))
+
+    # the index statistics are kept apart from the summaries written to the index file
+    statistics = [s.pop('statistics') for s in summaries if 'statistics' in s]
+    write_index(summaries)
+    indexed = corpus.build_index(statistics)
+
+    failed = [s for s in summaries if 'error' in s]
+    for summary in failed:
+        print("Error in {}:\n{}".format(summary['thread_path'], summary['error']))
+
+    print("Results saved in my_data/, with a summary in {}".format(INDEX_FILE))
+    if indexed > 0:
+        print("Statistics across {} chats saved in {}".format(indexed, corpus.INDEX_FOLDER))
+
+if __name__ == "__main__":
+    main(sys.argv)
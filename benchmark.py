@@ -0,0 +1,577 @@
+'''
+Benchmarks for the slow stages of chatstats
+
+Usage: python3 benchmark.py [num_messages]
+compares the rewritten stages against the code they replaced
+
+Usage: python3 benchmark.py --suite [--sizes 10000 100000 ...]
+times every stage on generated exports of each size, each in a fresh
+process, and compares the results against a stored baseline
+'''
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import random
+import string
+import datetime
+import numpy as np
+import pandas as pd
+import emoji
+import ftfy
+
+import assets
+import chatstats
+import chatstats_constants
+import classifier
+import config
+import emojis
+import loader
+import mojibake
+import profiling
+import render
+import sinks
+import synthetic
+import turns
+import util
+
+def export_messages(n, **options):
+    '''
+    Loads the raw messages of a synthetic export of n messages, as chatstats
+    reads them before clean_data
+    '''
+    with tempfile.TemporaryDirectory() as folder:
+        chat_folder = synthetic.write_export(os.path.join(folder, "benchmark"), n, **options)
+        _, messages = loader.load_thread(chat_folder, 1)
+    return messages
+
+def legacy_word_data(data):
+    '''
+    The original row-by-row word_data, kept as a reference for comparison
+    '''
+    def make_row(r, word, type):
+        return (r.sender_name, r.sender_first_name, r.datetime, r.date, r.term, word, type, 1)
+
+    data['words'] = data.content.str.strip().str.split()
+    data = data.dropna(subset=['words'])
+    data = data[data['type'] == 'Generic']
+
+    word_rows = list()
+    bigram_rows = list()
+    trigram_rows = list()
+
+    for row in data[
+        ['sender_name', 'sender_first_name', 'datetime', 'date', 'term', 'words']
+    ].iterrows():
+        r = row[1]
+
+        two_words_ago = None
+        one_word_ago = None
+
+        for word in r.words:
+            if word in chatstats_constants.EMOJI_SHORTCUTS:
+                word_rows.append( make_row(r, chatstats_constants.EMOJI_SHORTCUTS[word], 'emoji') )
+            elif word in emoji.UNICODE_EMOJI:
+                word_rows.append( make_row(r, word, 'emoji') )
+            elif util.is_hashtag(word):
+                word_rows.append( make_row(r, word, 'hashtag') )
+            else:
+                for c in word:
+                    if c in emoji.UNICODE_EMOJI:
+                        word_rows.append( make_row(r, c, 'emoji') )
+
+                word = word.lower().strip(string.punctuation)
+                if len(word) > 0:
+                    word_rows.append( make_row(r, word, 'word') )
+
+            if two_words_ago is not None:
+                trigram = "{} {} {}".format(two_words_ago, one_word_ago, word)
+                trigram_rows.append( make_row(r, trigram, 'word') )
+            two_words_ago = one_word_ago
+
+            if one_word_ago is not None:
+                bigram = "{} {}".format(one_word_ago, word)
+                bigram_rows.append( make_row(r, bigram, 'word') )
+            one_word_ago = word
+
+    column_names = [
+        'sender_name',
+        'sender_first_name',
+        'datetime',
+        'date',
+        'term',
+        'word',
+        'type',
+        'n_w'
+    ]
+
+    return tuple(
+        pd.DataFrame(rows, columns=column_names)
+        for rows in (word_rows, bigram_rows, trigram_rows)
+    )
+
+def timed(f, *args):
+    start = time.perf_counter()
+    result = f(*args)
+    return result, time.perf_counter() - start
+
+def bench_word_data(n):
+    messages = chatstats.clean_data(export_messages(n))
+
+    def legacy(data):
+        return [
+            words.groupby(util.NGRAM_AGGREGATE_COLUMNS, as_index=False)[['n_w']].sum()
+            for words in legacy_word_data(data)
+        ]
+
+    def vectorized(data):
+        return [util.aggregate_words(words, data) for words in chatstats.word_data(data)]
+
+    expected, legacy_time = timed(legacy, messages.copy())
+    actual, vectorized_time = timed(vectorized, messages.copy())
+
+    for e, a in zip(expected, actual):
+        pd.testing.assert_frame_equal(e, util.decode_categories(a.copy()), check_dtype=False)
+
+    print("word_data ({} messages, {} distinct words)".format(n, len(actual[0])))
+    print("   legacy:     {:.3f}s".format(legacy_time))
+    print("   vectorized: {:.3f}s ({:.1f}x)".format(vectorized_time, legacy_time / vectorized_time))
+
+# emoji made of several code points, which the per-character loop splits up
+MULTI_CODEPOINT_EMOJI = ["\U0001f44d\U0001f3fd", "\U0001f1e8\U0001f1e6", "\u2764\ufe0f", "\U0001f468\u200d\U0001f469\u200d\U0001f467"]
+
+def bench_emoji(n):
+    rng = random.Random(0)
+    emoji_words = synthetic.EMOJI + ["ok" + e for e in MULTI_CODEPOINT_EMOJI]
+    plain_words = [w for w in synthetic.WORDS + synthetic.HASHTAGS if w.isascii()]
+
+    def texts(emoji_share):
+        return [
+            " ".join(rng.choice(emoji_words if rng.random() < emoji_share else plain_words)
+                for _ in range(rng.randint(1, 15)))
+            for _ in range(n)
+        ]
+
+    def legacy(texts):
+        return [[c for c in text if c in emoji.UNICODE_EMOJI] for text in texts]
+
+    def trie(texts):
+        return [emojis.find_emoji(text) for text in texts]
+
+    _, build_time = timed(emojis.emoji_trie)
+    print("emoji extraction ({} messages, trie built in {:.3f}s)".format(n, build_time))
+
+    # most messages have no emoji, the dense case has one in most messages
+    for name, emoji_share in [("typical", 0.05), ("dense", 1)]:
+        sample = texts(emoji_share)
+        expected, legacy_time = timed(legacy, sample)
+        actual, trie_time = timed(trie, sample)
+        print("   {}".format(name))
+        print("      legacy:  {:.3f}s, {} emoji".format(legacy_time, sum(len(e) for e in expected)))
+        print("      trie:    {:.3f}s ({:.1f}x), {} emoji".format(
+            trie_time, legacy_time / trie_time, sum(len(a) for a in actual)
+        ))
+
+def bench_clean_data(n):
+    raw = export_messages(n)
+    messages = chatstats.clean_data(raw.copy())
+    messages['type'] = raw['type']
+    # text as it is written in a Facebook export, before clean_data repairs it
+    messages['export_content'] = raw['content']
+
+    def legacy_type(d):
+        def clean_type(row):
+            if row.game:
+                return 'Game'
+            elif row.plan_update:
+                return 'Plan Update'
+            elif row.chat_update:
+                return 'Chat Update'
+            elif row.call_update:
+                return 'Call Update'
+            else:
+                return row.type
+
+        d = d.copy()
+        d['game'] = d['content'].str.contains(chatstats_constants.GAME_REGEX, na=False)
+        d['plan_update'] = d['content'].str.contains(chatstats_constants.PLAN_UPDATE_REGEX, na=False)
+        d['chat_update'] = d['content'].str.contains(chatstats_constants.CHAT_UPDATE_REGEX, na=False)
+        d['call_update'] = d['content'].str.contains(chatstats_constants.CALL_UPDATE_REGEX, na=False)
+        return d.apply(clean_type, axis=1)
+
+    # (column, legacy per-row version, vectorized version)
+    columns = [
+        (
+            'content',
+            lambda d: d['export_content'].apply(lambda x: ftfy.ftfy(x) if type(x) == str else x),
+            lambda d: mojibake.repair(d['export_content']),
+        ),
+        (
+            'date',
+            lambda d: d['datetime'].apply(
+                lambda x: datetime.datetime(year=x.year, month=x.month, day=x.day)
+            ).map(lambda x: x.date()),
+            lambda d: d['datetime'].dt.date,
+        ),
+        (
+            'term',
+            lambda d: d['datetime'].apply(
+                lambda x: "{} {}".format(x.strftime('%Y'), util.to_term(int(x.strftime('%m'))))
+            ),
+            lambda d: d['datetime'].dt.year.astype(str) + ' ' + util.term_lookup()[d['datetime'].dt.month.to_numpy()],
+        ),
+        (
+            'type',
+            legacy_type,
+            lambda d: classifier.classify(d['content']).fillna(d['type']),
+        ),
+        (
+            'sender_first_name',
+            lambda d: d['sender_name'].apply(lambda s: s.split()[0]),
+            lambda d: d['sender_name'].map({name: name.split()[0] for name in d['sender_name'].unique()}),
+        ),
+    ]
+
+    print("clean_data columns ({} messages)".format(n))
+    for column, legacy, vectorized in columns:
+        expected, legacy_time = timed(legacy, messages)
+        actual, vectorized_time = timed(vectorized, messages)
+        # sticker messages have no content, compared as equal
+        assert pd.Series(expected.to_numpy()).equals(pd.Series(actual.to_numpy()))
+        print("   {:<18} legacy {:.3f}s, vectorized {:.3f}s ({:.1f}x)".format(
+            column, legacy_time, vectorized_time, legacy_time / vectorized_time
+        ))
+
+def bench_tf_idf(n):
+    messages = chatstats.clean_data(export_messages(n))
+    _, _, trigrams = chatstats.word_data(messages)
+    counts = util.group_words_by_sender(util.aggregate_words(trigrams, messages))
+    group = config.SENDER_COLUMN_NAME
+    k = util.DISTINGUISHING_TOP_K
+
+    def pandas_top(words):
+        result = util.tf_idf(words, group)
+        result = result[result['word'].str.len() >= util.DISTINGUISHING_MIN_LENGTH]
+        result = result[result['type'].isin(util.DISTINGUISHING_TYPES)]
+        return result.groupby(group).head(k)
+
+    def sparse_top(words):
+        return util.top_tf_idf(
+            words, group, k, types=util.DISTINGUISHING_TYPES, min_length=util.DISTINGUISHING_MIN_LENGTH
+        )
+
+    # imports scipy, so the timed call measures only the ranking
+    sparse_top(counts)
+
+    expected, pandas_time = timed(pandas_top, counts)
+    actual, sparse_time = timed(sparse_top, counts)
+
+    # groups come in the same order, but words with equal scores may be
+    # ranked in either order, so compare scores
+    assert expected[group].unique().tolist() == actual[group].unique().tolist()
+    for sender in expected[group].unique():
+        e = expected[expected[group] == sender]['tf_idf'].to_numpy()
+        a = actual[actual[group] == sender]['tf_idf'].to_numpy()
+        assert np.allclose(e, a)
+
+    print("tf_idf top {} trigrams ({} messages, {} rows)".format(k, n, len(counts)))
+    print("   pandas: {:.3f}s".format(pandas_time))
+    print("   sparse: {:.3f}s ({:.1f}x)".format(sparse_time, pandas_time / sparse_time))
+
+def bench_ingest(n):
+    with tempfile.TemporaryDirectory() as folder:
+        chat_folder = synthetic.write_export(os.path.join(folder, "benchmark"), n)
+        shards = len(loader.shard_files(chat_folder))
+
+        (_, serial), serial_time = timed(loader.load_thread, chat_folder, 1)
+        (_, parallel), parallel_time = timed(loader.load_thread, chat_folder, None)
+        pd.testing.assert_frame_equal(serial, parallel)
+
+    print("ingest ({} messages, {} shards, {} cpus)".format(n, shards, os.cpu_count()))
+    print("   serial:   {:.3f}s".format(serial_time))
+    print("   parallel: {:.3f}s ({:.1f}x)".format(parallel_time, serial_time / parallel_time))
+
+# seconds a command that only reads the index may take to start
+IMPORT_BUDGET = 1.0
+
+def bench_turns(n):
+    messages = chatstats.clean_data(export_messages(n))
+
+    def legacy(data):
+        data = data[~data['type'].isin(classifier.system_types())].sort_values('timestamp_ms', kind='stable')
+        gap = config.SESSION_GAP_MINUTES * 60 * 1000
+        replies = list()
+        starters = list()
+        previous = None
+        for timestamp, sender in zip(data['timestamp_ms'], data[config.SENDER_COLUMN_NAME]):
+            if previous is None or timestamp - previous[0] > gap:
+                starters.append(sender)
+            elif sender != previous[1]:
+                replies.append((sender, previous[1], (timestamp - previous[0]) / 1000))
+            previous = (timestamp, sender)
+        return replies, starters
+
+    def vectorized(data):
+        return turns.replies(data), turns.sessions(data)
+
+    (expected_replies, expected_starters), legacy_time = timed(legacy, messages)
+    (replies, sessions), vectorized_time = timed(vectorized, messages)
+    assert [tuple(r) for r in replies.astype({'sender': str, 'replied_to': str}).itertuples(index=False)] == expected_replies
+    assert sessions['starter'].tolist() == expected_starters
+
+    print("replies and conversations ({} messages, {} replies, {} conversations)".format(
+        n, len(replies), len(sessions)
+    ))
+    print("   legacy:     {:.3f}s".format(legacy_time))
+    print("   vectorized: {:.3f}s ({:.1f}x)".format(vectorized_time, legacy_time / vectorized_time))
+
+def bench_render(n):
+    '''
+    Times drawing every graph of a generated chat to files, as before, and to
+    memory in each format
+    '''
+    import contextlib
+    import matplotlib
+    matplotlib.use('Agg')
+
+    with tempfile.TemporaryDirectory() as folder:
+        chat_folder = synthetic.write_export(os.path.join(folder, "messages", "inbox", "benchmark"), n)
+        with contextlib.redirect_stdout(None):
+            datasets = chatstats.thread_datasets(*chatstats.process_thread(loader.chat_folder_path(chat_folder), jobs=1))
+        tasks = [(g, d) for g, d in chatstats.graph_tasks() if not g.is_empty(datasets[d])]
+        render.prepare_aggregations(tasks, datasets)
+
+        def draw(output, tight):
+            config.TIGHT_BBOX = tight
+            with contextlib.redirect_stdout(None):
+                render.draw(tasks, datasets, output, folder, 1)
+
+        runs = [
+            ("png files", sinks.FolderSink(folder, 'png'), True),
+            ("png memory", sinks.MemorySink('png'), True),
+            ("png, no tight bbox", sinks.MemorySink('png'), False),
+            ("svg memory", sinks.MemorySink('svg'), True),
+            ("json memory", sinks.MemorySink('json'), True),
+        ]
+        tight = config.TIGHT_BBOX
+        # drawn once first, so every run finds the plotting imports and fonts loaded
+        draw(sinks.MemorySink('json'), True)
+        print("render {} graphs ({} messages)".format(len(tasks), n))
+        for name, output, run_tight in runs:
+            _, seconds = timed(draw, output, run_tight)
+            print("   {:<20} {:.3f}s".format(name + ":", seconds))
+        config.TIGHT_BBOX = tight
+
+def bench_assets(threads=20, stickers=10):
+    '''
+    Times loading the stickers of one graph per thread in a single process,
+    as batch runs do, reading every file against loading each sticker once
+    '''
+    import matplotlib.pyplot as plt
+    from matplotlib import font_manager
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as folder:
+        files = list()
+        for i in range(stickers):
+            files.append(os.path.join(folder, "sticker_{}.png".format(i)))
+            Image.fromarray(rng.integers(0, 255, (480, 480, 4), dtype=np.uint8)).save(files[-1])
+
+        cache_folder = config.ASSET_CACHE_FOLDER
+        config.ASSET_CACHE_FOLDER = os.path.join(folder, "assets")
+
+        def legacy():
+            return [[plt.imread(f) for f in files] for _ in range(threads)]
+
+        def cached():
+            return [[assets.sticker_image(f) for f in files] for _ in range(threads)]
+
+        _, legacy_time = timed(legacy)
+        _, first_time = timed(cached)
+        # a new process finds the shrunk stickers on disk
+        assets._stickers.clear()
+        _, disk_time = timed(cached)
+        config.ASSET_CACHE_FOLDER = cache_folder
+
+    fonts = len(font_manager.fontManager.ttflist)
+    for _ in range(threads):
+        assets.register_fonts(matplotlib_fonts())
+    added = len(font_manager.fontManager.ttflist) - fonts
+
+    print("stickers ({} threads of {} stickers)".format(threads, stickers))
+    print("   legacy:     {:.3f}s".format(legacy_time))
+    print("   first run:  {:.3f}s ({:.1f}x)".format(first_time, legacy_time / first_time))
+    print("   next runs:  {:.3f}s ({:.1f}x)".format(disk_time, legacy_time / disk_time))
+    print("fonts registered {} times, {} fonts added".format(threads, added))
+
+def matplotlib_fonts():
+    import matplotlib
+    return os.path.join(matplotlib.get_data_path(), "fonts", "ttf")
+
+def bench_imports():
+    '''
+    Times startup in a fresh interpreter, where nothing is imported yet
+    '''
+    commands = [
+        ("import chatstats", [sys.executable, "-c", "import chatstats"]),
+        ("import batch", [sys.executable, "-c", "import batch"]),
+        ("batch.py --list", [sys.executable, "batch.py", "--list"]),
+    ]
+    for name, command in commands:
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        seconds = time.perf_counter() - start
+        status = "ok" if seconds < IMPORT_BUDGET else "over {}s budget".format(IMPORT_BUDGET)
+        print("{:<20} {:.3f}s  {}".format(name, seconds, status))
+
+# export sizes timed by the suite
+SUITE_SIZES = [10000, 100000, 1000000, 10000000]
+
+BASELINE_FILE = "benchmark_baseline.json"
+
+# a stage this many times slower than its baseline is reported as a regression
+REGRESSION_RATIO = 1.25
+
+# stages with these prefixes are added up into one line of the suite
+SUITE_GROUPS = [('aggregate ', 'aggregations'), ('render ', 'graphers')]
+
+def suite_size(n, export_options):
+    '''
+    Runs every stage on a generated export of n messages, returning the
+    stages recorded by profiling
+
+    Meant to run in a fresh process, so peak memory is that of this size alone
+    '''
+    import matplotlib
+    matplotlib.use('Agg')
+
+    with tempfile.TemporaryDirectory() as folder:
+        chat_folder = synthetic.write_export(
+            os.path.join(folder, "messages", "inbox", "benchmark"), n, **export_options
+        )
+        output_folder = os.path.join(folder, "output")
+        os.makedirs(output_folder)
+
+        profiling.start()
+        messages, words, bigrams, trigrams, daily = chatstats.process_thread(loader.chat_folder_path(chat_folder), jobs=1)
+
+        with profiling.stage('tf_idf') as record:
+            record['rows'] = len(util.tf_idf(util.WordData(words).grouped('sender'), config.SENDER_COLUMN_NAME))
+
+        datasets = chatstats.thread_datasets(messages, words, bigrams, trigrams, daily)
+        render.render_graphs(chatstats.graph_tasks(), datasets, sinks.FolderSink(output_folder), folder, jobs=1, use_manifest=False)
+        return profiling.take()
+
+def summarize_stages(stages):
+    '''
+    Returns the wall time, peak memory and rows of each stage, adding up
+    repeated stages and the aggregations and graphers
+    '''
+    summary = dict()
+    for stage in stages:
+        name = next((group for prefix, group in SUITE_GROUPS if stage['name'].startswith(prefix)), stage['name'])
+        if name not in summary:
+            summary[name] = {'wall_time': 0, 'peak_rss_mb': 0, 'rows': 0}
+        summary[name]['wall_time'] = round(summary[name]['wall_time'] + stage['wall_time'], 6)
+        peak = stage.get('peak_rss_mb') or stage.get('process_peak_rss_mb') or 0
+        summary[name]['peak_rss_mb'] = max(summary[name]['peak_rss_mb'], peak)
+        summary[name]['rows'] += stage.get('rows') or 0
+    return summary
+
+def read_baseline(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def bench_suite(sizes, export_options, baseline_path=BASELINE_FILE, save_baseline=False):
+    baseline = read_baseline(baseline_path)
+    results = dict()
+    for n in sizes:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            stages = pool.submit(suite_size, n, export_options).result()
+        results[str(n)] = summarize_stages(stages)
+
+        print("suite ({} messages)".format(n))
+        print("   {:<18} {:>9} {:>14} {:>9} {:>13}".format("stage", "wall", "messages/s", "peak MB", "vs baseline"))
+        for name, stage in results[str(n)].items():
+            base = baseline.get(str(n), {}).get(name)
+            comparison = ""
+            if base is not None and base['wall_time'] > 0:
+                ratio = stage['wall_time'] / base['wall_time']
+                comparison = "{:.2f}x{}".format(ratio, " SLOWER" if ratio > REGRESSION_RATIO else "")
+            print("   {:<18} {:>8.3f}s {:>14,.0f} {:>9.1f} {:>13}".format(
+                name, stage['wall_time'], n / max(stage['wall_time'], 1e-9), stage['peak_rss_mb'], comparison
+            ))
+
+    if save_baseline:
+        baseline.update(results)
+        with open(baseline_path, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print("Baseline saved in {}".format(baseline_path))
+
+def system_mix(value):
+    '''
+    Parses a system message mix such as "Game=0.01,Chat Update=0.005"
+    '''
+    mix = dict()
+    for item in value.split(","):
+        system_type, share = item.split("=")
+        if system_type.strip() not in synthetic.SYSTEM_MESSAGES:
+            raise argparse.ArgumentTypeError("unknown system message type {}".format(system_type))
+        mix[system_type.strip()] = float(share)
+    return mix
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog=argv[0], description="Benchmark the stages of chatstats")
+    parser.add_argument('num_messages', nargs='?', type=int, default=100000,
+        help="messages used to compare rewritten stages against the code they replaced")
+    parser.add_argument('--suite', action='store_true', help="time every stage on generated exports instead")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SUITE_SIZES[:2],
+        help="numbers of messages of the generated exports, up to {:,}".format(SUITE_SIZES[-1]))
+    parser.add_argument('--senders', type=int, default=4, help="people in the generated chats")
+    parser.add_argument('--shards', type=int, help="message_N.json files per export (default: as many as Facebook)")
+    parser.add_argument('--emoji', type=float, default=0.05, help="share of words that are emoji")
+    parser.add_argument('--hashtags', type=float, default=0.01, help="share of words that are hashtags")
+    parser.add_argument('--stickers', type=float, default=0.02, help="share of messages that are stickers")
+    parser.add_argument('--system-mix', type=system_mix, default=synthetic.SYSTEM_MIX,
+        help="share of messages of each system message type, e.g. \"Game=0.01,Chat Update=0.005\"")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="results to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="save these results as the baseline")
+    return parser.parse_args(argv[1:])
+
+def main(argv):
+    args = parse_args(argv)
+    if args.suite:
+        export_options = {
+            'shards': args.shards,
+            'senders': args.senders,
+            'emoji': args.emoji,
+            'hashtags': args.hashtags,
+            'stickers': args.stickers,
+            'system_mix': args.system_mix,
+        }
+        bench_suite(args.sizes, export_options, args.baseline, args.save_baseline)
+        return
+
+    n = args.num_messages
+    bench_imports()
+    bench_ingest(n)
+    bench_clean_data(n)
+    bench_word_data(n)
+    bench_emoji(n)
+    bench_tf_idf(n)
+    bench_turns(n)
+    bench_render(n)
+    bench_assets()
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,124 @@
+'''
+Cache of cleaned messages and n-gram counts, so unchanged exports skip straight
+to graphing and grown exports only process their new messages
+'''
+
+import os
+import json
+import hashlib
+import importlib.util
+
+import config
+import loader
+
+CACHE_FOLDER = ".cache"
+FINGERPRINT_FILE = "fingerprint.json"
+
+# bump when clean_data or word_data change what they output
+CACHE_VERSION = 5
+
+# config values that change the cleaned data
+CONFIG_KEYS = ['TIMEZONE', 'TERMS_PER_YEAR', 'TERM_SUFFIX', 'SENDER_COLUMN_NAME']
+
+# message columns used by graphers, the raw Facebook columns are not cached
+MESSAGE_COLUMNS = [
+    'sender_name',
+    'sender_first_name',
+    'timestamp_ms',
+    'datetime',
+    'date',
+    'term',
+    'type',
+    'content',
+    'sticker',
+    'call_duration',
+]
+
+TABLES = ['messages', 'words', 'bigrams', 'trigrams', 'daily_words']
+
+def available():
+    '''
+    Parquet files need pyarrow, without it the cache is skipped
+    '''
+    return importlib.util.find_spec('pyarrow') is not None
+
+def slim_messages(messages):
+    '''
+    Keeps only the message columns used by graphers
+    '''
+    return messages[[c for c in MESSAGE_COLUMNS if c in messages.columns]]
+
+def cache_folder(output_folder):
+    return os.path.join(output_folder, CACHE_FOLDER)
+
+def digest(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()
+
+def fingerprint(chat_folder):
+    '''
+    Hashes the relevant config, and separately the size and modification time
+    of every shard
+    '''
+    shards = list()
+    for file in loader.shard_files(chat_folder):
+        stat = os.stat(file)
+        shards.append([os.path.basename(file), stat.st_size, stat.st_mtime_ns])
+
+    return {
+        'config': digest({
+            'version': CACHE_VERSION,
+            'config': {k: getattr(config, k) for k in CONFIG_KEYS},
+        }),
+        'shards': digest(shards),
+    }
+
+def table_path(output_folder, table):
+    return os.path.join(cache_folder(output_folder), "{}.parquet".format(table))
+
+def stored_fingerprint(output_folder):
+    '''
+    Returns the fingerprint of the cached data, or None if there is no cache
+    '''
+    try:
+        with open(os.path.join(cache_folder(output_folder), FINGERPRINT_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def cached_messages(output_folder):
+    '''
+    Returns the number of cached messages from the table's metadata, without reading it
+    '''
+    import pyarrow.parquet as pq
+    return pq.read_metadata(table_path(output_folder, 'messages')).num_rows
+
+def load(output_folder):
+    '''
+    Returns the cached (messages, words, bigrams, trigrams, daily_words), or
+    None if unreadable
+
+    The n-gram tables hold counts aggregated by util.aggregate_words, and
+    daily_words the counts of trends.daily_counts
+    '''
+    import pandas as pd
+    try:
+        return tuple(pd.read_parquet(table_path(output_folder, table)) for table in TABLES)
+    except (OSError, ValueError):
+        return None
+
+def save(output_folder, key, messages, words, bigrams, trigrams, daily_words):
+    folder = cache_folder(output_folder)
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+
+    # remove the old fingerprint first so a partial write is never read as valid
+    fingerprint_path = os.path.join(folder, FINGERPRINT_FILE)
+    if os.path.exists(fingerprint_path):
+        os.remove(fingerprint_path)
+
+    messages = slim_messages(messages)
+    for table, data in zip(TABLES, (messages, words, bigrams, trigrams, daily_words)):
+        data.to_parquet(table_path(output_folder, table), index=False)
+
+    with open(fingerprint_path, 'w') as f:
+        json.dump(key, f)
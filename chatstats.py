@@ -4,49 +4,46 @@ Core functionality: use message data json to output graphs
 
 import os
 import sys
-import pandas as pd
-import json
+import argparse
 import string
-import emoji
-import ftfy
-import datetime
-import warnings
 
-from grapher import message_graphers, word_graphers, bigram_graphers, trigram_graphers
+import cache
+import classifier
 import chatstats_constants
 import config
-import util
-
-def clean_type(row):
-    if row.game:
-        return 'Game'
-    elif row.plan_update:
-        return 'Plan Update'
-    elif row.chat_update:
-        return 'Chat Update'
-    elif row.call_update:
-        return 'Call Update'
-    else:
-        return row.type
+import corpus
+import loader
+import profiling
+import render
+import sinks
+
+# pandas, numpy, emoji, ftfy and the graphers are slow to import, so they are
+# imported by the stages that use them, and commands that only read the cache
+# or merge exports start quickly
 
 def clean_data(data):
     '''
     Augment the raw Facebook data for our graphing use cases
     '''
+    import pandas as pd
+    import mojibake
+    import util
+    # chats without any text or stickers have no column for them
+    for column in ['content', 'sticker']:
+        if column not in data.columns:
+            data[column] = None
+
     # set timezone
     data['datetime'] = pd.DatetimeIndex(
         pd.to_datetime(data['timestamp_ms'],unit='ms')
     ).tz_localize('UTC').tz_convert(config.TIMEZONE)
 
     # column for just date
-    data['date'] = data["datetime"].apply(
-        lambda d : datetime.datetime(year=d.year, month=d.month, day=d.day)
-    ).map(lambda x:x.date())
+    data['date'] = data['datetime'].dt.date
 
     # column for term of date
-    data['term'] =  pd.to_datetime(data['datetime']).apply(
-        lambda d : "{} {}".format( d.strftime('%Y'), util.to_term(int(d.strftime('%m'))) )
-    )
+    terms = util.term_lookup()
+    data['term'] = data['datetime'].dt.year.astype(str) + ' ' + terms[data['datetime'].dt.month.to_numpy()]
 
     # clean up sticker data
     data['sticker'] = data['sticker'].apply(lambda s: s['uri'] if not pd.isnull(s) else None)
@@ -60,166 +57,490 @@ def clean_data(data):
     )
 
     # format text properly
-    data['content'] = data['content'].apply(lambda x: ftfy.ftfy(x) if type(x) == str else x)
-
-    # properly set message type, adding types 'Game', 'Plan Update', 'Chat Update'
-    warnings.filterwarnings("ignore", 'This pattern has match groups')
-    data['game'] = data['content'].str.contains(chatstats_constants.GAME_REGEX, na=False)
-    data['plan_update'] = data['content'].str.contains(chatstats_constants.PLAN_UPDATE_REGEX, na=False)
-    data['chat_update'] = data['content'].str.contains(chatstats_constants.CHAT_UPDATE_REGEX, na=False)
-    data['call_update'] = data['content'].str.contains(chatstats_constants.CALL_UPDATE_REGEX, na=False)
+    data['content'] = mojibake.repair(data['content'])
 
-    data['type'] = data.apply(lambda x: clean_type(x), axis=1)
+    # properly set message type, adding types 'Game', 'Plan Update', 'Chat Update', 'Call Update'
+    data['type'] = classifier.classify(data['content']).fillna(data['type'])
 
     # add first name column
-    data['sender_first_name'] = data['sender_name'].apply(lambda s: s.split()[0])
+    first_names = {name: name.split()[0] for name in data['sender_name'].unique()}
+    data['sender_first_name'] = data['sender_name'].map(first_names)
 
     return data
 
-def make_row(r, word, type):
-    return (
-        r.sender_name,
-        r.sender_first_name,
-        r.datetime,
-        r.date,
-        r.term,
-        word,
-        type,
-        1
-    )
+NGRAM_COLUMNS = ['message_id', 'word', 'type', 'n_w']
+
+TOKEN_TYPES = ['emoji', 'hashtag', 'word']
+
+def classify_token(token):
+    '''
+    Returns the (word, type) rows produced by a token, and the form of the
+    token used when building bigrams and trigrams
+    '''
+    import emoji
+    import emojis
+    import util
+    if token in chatstats_constants.EMOJI_SHORTCUTS:
+        return [(chatstats_constants.EMOJI_SHORTCUTS[token], 'emoji')], token
+    elif token in emoji.UNICODE_EMOJI:
+        return [(token, 'emoji')], token
+    elif util.is_hashtag(token):
+        return [(token, 'hashtag')], token
+
+    rows = [(e, 'emoji') for e in emojis.find_emoji(token)]
+    gram = token.lower().strip(string.punctuation)
+    if len(gram) > 0:
+        rows.append((gram, 'word'))
+    return rows, gram
+
+def token_table(tokens):
+    '''
+    Classifies each distinct token once
+
+    Returns factorized codes for the tokens, and lookup arrays by code: the
+    number of rows each token produces, where its rows start in the flat row
+    arrays, and its n-gram form
+    '''
+    import numpy as np
+    import pandas as pd
+    codes, uniques = pd.factorize(tokens)
+
+    counts = np.zeros(len(uniques), dtype=np.int64)
+    grams = np.empty(len(uniques), dtype=object)
+    row_words = list()
+    row_types = list()
+    for i, token in enumerate(uniques):
+        rows, grams[i] = classify_token(token)
+        counts[i] = len(rows)
+        for word, type in rows:
+            row_words.append(word)
+            row_types.append(TOKEN_TYPES.index(type))
+
+    offsets = np.cumsum(counts) - counts
+    return codes, counts, offsets, grams, np.array(row_words, dtype=object), np.array(row_types, dtype=np.int64)
+
+def repeat_ranges(starts, lengths):
+    '''
+    Concatenates the ranges [start, start + length) into one index array
+    '''
+    import numpy as np
+    total = lengths.sum()
+    ends = np.cumsum(lengths)
+    within = np.arange(total) - np.repeat(ends - lengths, lengths)
+    return np.repeat(starts, lengths) + within
+
+def count_ngrams(message_ids, word_codes, vocabulary, type_codes):
+    '''
+    Counts each (message, word, type) into a compact dataframe, where word and
+    type are categoricals with sorted categories
+    '''
+    import numpy as np
+    import pandas as pd
+    key = (message_ids * len(vocabulary) + word_codes) * len(TOKEN_TYPES) + type_codes
+    key, n_w = np.unique(key, return_counts=True)
+    key, type_codes = np.divmod(key, len(TOKEN_TYPES))
+    message_ids, word_codes = np.divmod(key, len(vocabulary))
+
+    return pd.DataFrame({
+        'message_id': message_ids,
+        'word': pd.Categorical.from_codes(word_codes, categories=vocabulary),
+        'type': pd.Categorical.from_codes(type_codes, categories=TOKEN_TYPES),
+        'n_w': n_w,
+    }, columns=NGRAM_COLUMNS)
+
+def join_ngrams(gram_codes, gram_vocabulary, ends, n):
+    '''
+    Builds the n-grams ending at each index of ends out of integer gram codes,
+    so each distinct n-gram string is only built once
+
+    Returns the code of each n-gram and the sorted n-gram vocabulary
+    '''
+    import numpy as np
+    import pandas as pd
+    size = len(gram_vocabulary)
+    codes = gram_codes[ends - n + 1]
+    vocabulary = gram_vocabulary
+    for i in range(n - 2, -1, -1):
+        # renumber the distinct prefixes after each word so codes never overflow
+        distinct, codes = np.unique(codes * size + gram_codes[ends - i], return_inverse=True)
+        prefix, last = np.divmod(distinct, size)
+        vocabulary = vocabulary[prefix] + ' ' + gram_vocabulary[last]
+
+    sorted_codes, vocabulary = pd.factorize(vocabulary, sort=True)
+    return sorted_codes[codes], vocabulary
 
 def word_data(data):
     '''
-    Creates dataframe of words
+    Counts the words, bigrams and trigrams of each message
+
+    Returns a dataframe for each n-gram level with a row per message, word and
+    type. message_id is the position of the message in data, word and type are
+    categoricals, and n_w is the count. util.aggregate_words adds the sender
+    and term to these counts.
 
-    This can take a long time to run
+    Tokens are exploded into one flat array and classified once per distinct
+    token. N-grams are built as integer codes by shifting that array within
+    each message, so each distinct n-gram string is only built once.
     '''
+    import numpy as np
+    import pandas as pd
     data['words'] = data.content.str.strip().str.split()
-    data = data.dropna(subset=['words'])
-    data = data[data['type'] == 'Generic']
-
-    # create word count dataframe
-    word_rows = list()
-    bigram_rows = list()
-    trigram_rows = list()
-
-    for row in data[
-        ['sender_name', 'sender_first_name', 'datetime', 'date', 'term', 'words']
-    ].iterrows():
-        r = row[1]
-
-        two_words_ago = None
-        one_word_ago = None
-
-        for word in r.words:
-            if word in chatstats_constants.EMOJI_SHORTCUTS:
-                word_rows.append( make_row(r, chatstats_constants.EMOJI_SHORTCUTS[word], 'emoji') )
-            elif word in emoji.UNICODE_EMOJI:
-                word_rows.append( make_row(r, word, 'emoji') )
-            elif util.is_hashtag(word):
-                word_rows.append( make_row(r, word, 'hashtag') )
-            else:
-                for c in word:
-                    if c in emoji.UNICODE_EMOJI:
-                        word_rows.append( make_row(r, c, 'emoji') )
-
-                word = word.lower().strip(string.punctuation)
-                if len(word) > 0:
-                    word_rows.append( make_row(r, word, 'word') )
-
-            if two_words_ago is not None:
-                trigram = "{} {} {}".format(two_words_ago, one_word_ago, word)
-                trigram_rows.append( make_row(r, trigram, 'word') )
-            two_words_ago = one_word_ago
-
-            if one_word_ago is not None:
-                bigram = "{} {}".format(one_word_ago, word)
-                bigram_rows.append( make_row(r, bigram, 'word') )
-            one_word_ago = word
-
-    column_names = [
-        'sender_name',
-        'sender_first_name',
-        'datetime',
-        'date',
-        'term',
-        'word',
-        'type',
-        'n_w'
-    ]
+    words = data['words'].reset_index(drop=True)
+    words = words[words.notna().to_numpy() & (data['type'] == 'Generic').to_numpy()]
+
+    tokens = words.explode().dropna()
+    message_ids = tokens.index.to_numpy()
+    tokens = tokens.to_numpy(dtype=object)
+
+    if len(tokens) == 0:
+        empty = count_ngrams(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), [], np.zeros(0, dtype=np.int64))
+        return empty, empty.copy(), empty.copy()
+
+    codes, counts, offsets, grams, row_words, row_types = token_table(tokens)
+
+    # each token occurrence expands to the rows of its distinct token
+    occurrence_counts = counts[codes]
+    row_index = repeat_ranges(offsets[codes], occurrence_counts)
+    row_word_codes, vocabulary = pd.factorize(row_words, sort=True)
+    word_counts = count_ngrams(
+        np.repeat(message_ids, occurrence_counts),
+        row_word_codes[row_index],
+        vocabulary,
+        row_types[row_index]
+    )
 
-    words = pd.DataFrame(word_rows, columns=column_names)
-    bigrams = pd.DataFrame(bigram_rows, columns=column_names)
-    trigrams = pd.DataFrame(trigram_rows, columns=column_names)
+    # position of each token within its message
+    starts = np.r_[True, message_ids[1:] != message_ids[:-1]]
+    token_pos = np.arange(len(tokens)) - np.maximum.accumulate(np.where(starts, np.arange(len(tokens)), 0))
+
+    gram_codes, gram_vocabulary = pd.factorize(grams, sort=True)
+    gram_codes = gram_codes[codes]
+
+    ngram_counts = list()
+    for n in (2, 3):
+        ends = np.flatnonzero(token_pos >= n - 1)
+        ngram_codes, ngram_vocabulary = join_ngrams(gram_codes, gram_vocabulary, ends, n)
+        ngram_counts.append(count_ngrams(
+            message_ids[ends],
+            ngram_codes,
+            ngram_vocabulary,
+            TOKEN_TYPES.index('word')
+        ))
+
+    return word_counts, ngram_counts[0], ngram_counts[1]
+
+def profiled_clean_data(messages):
+    with profiling.stage('clean_data') as record:
+        messages = clean_data(messages)
+        record['rows'] = len(messages)
+    return messages
+
+def profiled_word_data(messages):
+    '''
+    Returns the aggregated word, bigram and trigram counts of the messages,
+    and the word counts of each day
+    '''
+    import trends
+    import util
+    with profiling.stage('word_data') as record:
+        ngrams = word_data(messages)
+        record['rows'] = sum(len(n) for n in ngrams)
+    with profiling.stage('daily_counts') as record:
+        daily = trends.daily_counts(ngrams[0], messages)
+        record['rows'] = len(daily)
+    with profiling.stage('aggregate_words') as record:
+        ngrams = tuple(util.aggregate_words(n, messages) for n in ngrams)
+        record['rows'] = sum(len(n) for n in ngrams)
+    return ngrams + (daily,)
+
+def process_thread(chat_folder, jobs=config.INGEST_WORKERS):
+    '''
+    Loads, cleans and counts the words of every message in a thread
+    '''
+    with profiling.stage('load') as record:
+        metadata, messages = loader.load_thread(chat_folder, jobs)
+        record['rows'] = len(messages)
+    messages = profiled_clean_data(messages)
+    ngrams = profiled_word_data(messages)
+    return (messages,) + ngrams
+
+def merge_counts(counts):
+    '''
+    Adds a list of (words, bigrams, trigrams, daily) counts together, grouping
+    each table once however many sets of counts there are
+    '''
+    import trends
+    import util
+    words, bigrams, trigrams, daily = zip(*counts)
+    return (
+        util.merge_word_counts(words),
+        util.merge_word_counts(bigrams),
+        util.merge_word_counts(trigrams),
+        trends.merge_daily_counts(daily),
+    )
 
-    return words, bigrams, trigrams
+def stream_thread(chat_folder):
+    '''
+    Processes a thread a chunk of messages at a time, so that the raw messages
+    are never all in memory
 
-def main(argv):
-    if len(argv) != 2:
-        print('Usage: {} <message_folder>'.format(argv[0]))
-        sys.exit(2)
+    Only the message columns used by graphers are kept. The counts of each
+    chunk are added together once every chunk is read. Raises
+    loader.EmptyThread if the thread has no messages
+    '''
+    import pandas as pd
+    messages = list()
+    ngrams = list()
+    chunks = loader.iter_message_chunks(chat_folder)
+    while True:
+        # each chunk is read when the next one is asked for
+        with profiling.stage('load') as record:
+            chunk = next(chunks, None)
+            record['rows'] = len(chunk) if chunk is not None else 0
+        if chunk is None:
+            break
+        chunk = profiled_clean_data(chunk)
+        ngrams.append(profiled_word_data(chunk))
+        messages.append(cache.slim_messages(chunk))
+
+    if len(messages) == 0:
+        raise loader.EmptyThread(chat_folder)
+    messages = pd.concat(messages, ignore_index=True, sort=False)
+    with profiling.stage('merge_counts') as record:
+        record['rows'] = sum(len(words) for words, bigrams, trigrams, daily in ngrams)
+        ngrams = merge_counts(ngrams)
+    return (messages,) + ngrams
+
+def update_thread(chat_folder, messages, words, bigrams, trigrams, daily):
+    '''
+    Adds the messages that are newer than the processed ones, for exports that
+    are a superset of the previous export
+    '''
+    import pandas as pd
+    with profiling.stage('load') as record:
+        new_messages = loader.load_new_messages(chat_folder, messages['timestamp_ms'].max())
+        record['rows'] = len(new_messages)
+    if len(new_messages) == 0:
+        return messages, words, bigrams, trigrams, daily
+
+    new_messages = profiled_clean_data(new_messages)
+    new_ngrams = profiled_word_data(new_messages)
+    messages = pd.concat([new_messages, messages], ignore_index=True, sort=False)
+    return (messages,) + merge_counts([(words, bigrams, trigrams, daily), new_ngrams])
+
+def load_data(chat_folder, output_folder, use_cache=True, stream=False, incremental=False,
+        ingest_jobs=config.INGEST_WORKERS):
+    '''
+    Returns the cleaned messages, the word, bigram and trigram counts and the
+    daily word counts of a thread, reusing or extending the cache in
+    output_folder when possible
+    '''
+    use_cache = use_cache and config.USE_CACHE and cache.available()
+    key = cache.fingerprint(chat_folder)
+    stored_key = cache.stored_fingerprint(output_folder) if use_cache else None
+    can_update = incremental and stored_key is not None and stored_key['config'] == key['config']
+    cached = None
+    if stored_key == key or can_update:
+        with profiling.stage('cache_load') as record:
+            cached = cache.load(output_folder)
+            record['rows'] = len(cached[0]) if cached is not None else 0
+
+    if cached is None and stream:
+        data = stream_thread(chat_folder)
+    elif cached is None:
+        data = process_thread(chat_folder, ingest_jobs)
+    elif stored_key == key:
+        data = cached
+    else:
+        data = update_thread(chat_folder, *cached)
 
-    print("Plotting graphs... This may take a minute.")
+    if use_cache and stored_key != key:
+        with profiling.stage('cache_save') as record:
+            cache.save(output_folder, key, *data)
+            record['rows'] = len(data[0])
 
-    message_arg =  argv[1]
-    CHAT_FILE = "message.json"
+    return data
 
-    result_messages = []
-    json_template = {}
-    # get messages.json and its directory
-    if message_arg.endswith(CHAT_FILE):
-        json_file = message_arg
-        chat_folder = message_arg[:-len(CHAT_FILE)]
-    else:
-        chat_folder = message_arg
-        if not chat_folder.endswith("/"):
-            chat_folder = "{}/".format(chat_folder)
-        json_file = "{}{}".format(chat_folder, CHAT_FILE)
-
-    for file in os.listdir(chat_folder):
-        if file.endswith(".json") and file != "message.json":
-            # Print the file name to debug
-            print(os.path.join(chat_folder, file))
-            with open(os.path.join(chat_folder, file)) as f:
-                data = json.load(f)
-                if (len(json_template) == 0):
-                    json_template = data
-                messages = data["messages"]
-                result_messages += messages
-
-    json_template['messages'] = result_messages
-
-    with open(os.path.join(chat_folder, "message.json"),'w') as f:
-        f.write(json.dumps(json_template, indent=2))
+def thread_summary(thread_path, output_folder, messages, words):
+    '''
+    Describes a graphed thread for the batch index
+    '''
+    return {
+        'thread_path': thread_path,
+        'output_folder': output_folder,
+        'messages': len(messages),
+        'words': int(words['n_w'].sum()),
+        'senders': sorted(messages['sender_name'].dropna().unique().tolist()),
+        'first_message': messages['date'].min().isoformat() if len(messages) > 0 else None,
+        'last_message': messages['date'].max().isoformat() if len(messages) > 0 else None,
+    }
+
+def top_emoji(words, n=10):
+    '''
+    Returns the n emoji used most in a thread, from its words dataset
+    '''
+    counts = words.by_sender()
+    counts = counts[counts['type'] == 'emoji']
+    return counts.groupby('word', observed=True)['n_w'].sum().sort_values(ascending=False).head(n).index.tolist()
+
+def graph_tasks():
+    '''
+    Returns the (grapher, dataset name) pair of every graph
+    '''
+    from grapher import message_graphers, turn_graphers, word_graphers, bigram_graphers, trigram_graphers, trend_graphers
+    return [(grapher, 'messages') for grapher in message_graphers] + \
+        [(grapher, 'turns') for grapher in turn_graphers] + \
+        [(grapher, 'words') for grapher in word_graphers] + \
+        [(grapher, 'bigrams') for grapher in bigram_graphers] + \
+        [(grapher, 'trigrams') for grapher in trigram_graphers] + \
+        [(grapher, 'trends') for grapher in trend_graphers]
+
+def thread_datasets(messages, words, bigrams, trigrams, daily):
+    '''
+    Returns the data each graph_tasks dataset name refers to
+    '''
+    import trends
+    import turns
+    import util
+    datasets = {'messages': messages}
+    for level, counts in zip(corpus.LEVELS, (words, bigrams, trigrams)):
+        document_frequencies = None
+        if config.TFIDF_CORPUS == "inbox" and corpus.available():
+            document_frequencies = corpus.document_frequencies(level)
+        datasets[level] = util.WordData(counts, document_frequencies)
+    datasets['trends'] = trends.TrendIndex(daily)
+    datasets['turns'] = turns.TurnData(messages)
+    return datasets
+
+def output_folder_path(chat_folder):
+    return 'my_data/{}'.format(loader.thread_path(chat_folder))
+
+def graph_thread(chat_folder, use_cache=True, stream=False, incremental=False,
+        ingest_jobs=config.INGEST_WORKERS, render_jobs=config.RENDER_WORKERS,
+        graph_format=config.GRAPH_FORMAT, archive=config.ARCHIVE_GRAPHS, statistics=False, emoji=False):
+    '''
+    Processes a thread and saves its graphs, returning a summary of the thread
 
+    Graphs are saved in graph_format, as files or in one zip archive if archive is set.
+    With statistics, the summary also holds the thread's corpus.thread_statistics,
+    and with emoji its top_emoji
+    '''
     # get the parent folder of the messages directory
     parent_folder = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(chat_folder))))
 
-    # open json file as dict
-    json_data = json.loads(open(json_file).read())
-
     # create output folder for graphs
-    output_folder = 'my_data/{}'.format(json_data["thread_path"])
+    thread_path = loader.thread_path(chat_folder)
+    output_folder = output_folder_path(chat_folder)
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
 
-    # generate graphs that use message data
-    messages = clean_data(pd.DataFrame(json_data["messages"]))
-    for grapher in message_graphers:
-        grapher.graph(messages, output_folder, parent_folder)
+    messages, words, bigrams, trigrams, daily = load_data(
+        chat_folder,
+        output_folder,
+        use_cache=use_cache,
+        stream=stream,
+        incremental=incremental,
+        ingest_jobs=ingest_jobs
+    )
 
-    # generate graphs that use word data
-    words, bigrams, trigrams = word_data(messages)
-    for grapher in word_graphers:
-        grapher.graph(words, output_folder, parent_folder)
+    datasets = thread_datasets(messages, words, bigrams, trigrams, daily)
+    with sinks.open_sink(output_folder, graph_format, archive) as output:
+        render.render_graphs(graph_tasks(), datasets, output, parent_folder, render_jobs, use_manifest=use_cache)
+
+    summary = thread_summary(thread_path, output_folder, messages, words)
+    if statistics:
+        summary['statistics'] = corpus.thread_statistics(thread_path, messages, words, bigrams, trigrams)
+    if emoji:
+        summary['top_emoji'] = top_emoji(datasets['words'])
+    return summary
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog=argv[0], description="Graph a Facebook Messenger conversation")
+    parser.add_argument('message_folder', help="folder of the conversation in your Facebook data")
+    parser.add_argument(
+        '--merge-export',
+        action='store_true',
+        help="only write every message_N.json of the conversation into one message.json"
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help="reprocess the conversation even if it has not changed since the last run"
+    )
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help="process the conversation in chunks to limit memory use on very large chats"
+    )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help="only process messages newer than the last run, for exports that only add messages"
+    )
+    parser.add_argument(
+        '--format',
+        default=config.GRAPH_FORMAT,
+        choices=sorted(sinks.FORMATS),
+        help="save graphs as png or svg images, or as json of the data each graph plots"
+    )
+    parser.add_argument(
+        '--zip',
+        action='store_true',
+        default=config.ARCHIVE_GRAPHS,
+        help="save the graphs in one {} instead of a file per graph".format(sinks.ARCHIVE_FILE)
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help="save the time and memory used by each stage to {} in the results folder".format(profiling.TRACE_FILE)
+    )
+    parser.add_argument(
+        '--cprofile',
+        action='store_true',
+        help="like --profile, and also save a cProfile of each stage to the profile folder in the results folder"
+    )
+    return parser.parse_args(argv[1:])
 
-    for grapher in bigram_graphers:
-        grapher.graph(bigrams, output_folder, parent_folder)
+def main(argv):
+    args = parse_args(argv)
+    chat_folder = loader.chat_folder_path(args.message_folder)
+
+    if args.merge_export:
+        loader.merge_export(chat_folder)
+        print("Merged export saved in {}{}".format(chat_folder, loader.CHAT_FILE))
+        return
 
-    for grapher in trigram_graphers:
-        grapher.graph(trigrams, output_folder, parent_folder)
+    output_folder = output_folder_path(chat_folder)
+    if args.profile or args.cprofile:
+        profiling.start(os.path.join(output_folder, 'profile') if args.cprofile else None)
+
+    print("Plotting graphs... This may take a minute.")
 
-    print("Results saved in {}".format(output_folder))
+    try:
+        summary = graph_thread(
+            chat_folder,
+            use_cache=not args.no_cache,
+            stream=args.stream,
+            incremental=args.incremental,
+            graph_format=args.format,
+            archive=args.zip,
+            emoji=True
+        )
+    except loader.EmptyThread as e:
+        print("{}, there is nothing to graph".format(e))
+        sys.exit(1)
+
+    if summary['top_emoji']:
+        print("Your top emojis:")
+        print("   ".join(["{}. {}".format(i+1, e) for i, e in enumerate(summary['top_emoji'])]))
+
+    if args.profile or args.cprofile:
+        print("Slowest stages:")
+        print("\n".join(profiling.summary()))
+        profiling.write(os.path.join(output_folder, profiling.TRACE_FILE))
+        print("Profile saved in {}".format(os.path.join(output_folder, profiling.TRACE_FILE)))
+
+    print("Results saved in {}".format(summary['output_folder']))
 
 if __name__ == "__main__":
     main(sys.argv)
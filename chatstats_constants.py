@@ -6,26 +6,31 @@ WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday",
 
 # a message that matches this regex was generated by a Facebook game
 # note that this can get some false positives
-GAME_REGEX = "^.+ scored (1 point|\d+ points) (playing|in) .+\.$|" + \
-    "^.+ set a new personal best of (1 point|\d+ points) in .+\.$|" + \
-    "^(You are|.+ is) now in first place in .+\.$|" + \
-    "^.+ challenged you in .+\.$|" + \
-    "^You challenged .+ in .+\.$|" + \
-    "^.+ set the new high score of (1 point|\d+ points) playing .+\.$"
+# groups are non-capturing so the patterns can be combined by classifier.py
+GAME_REGEX = r"^.+ scored (?:1 point|\d+ points) (?:playing|in) .+\.$|" + \
+    r"^.+ set a new personal best of (?:1 point|\d+ points) in .+\.$|" + \
+    r"^(?:You are|.+ is) now in first place in .+\.$|" + \
+    r"^.+ challenged you in .+\.$|" + \
+    r"^You challenged .+ in .+\.$|" + \
+    r"^.+ set the new high score of (?:1 point|\d+ points) playing .+\.$"
 
 # matches plan updates
-PLAN_UPDATE_REGEX = "^.+ started a plan\.$|" + \
-    "^.+ named the plan .+\.$|" + \
-    "^.+ deleted the plan for .+ at .+\.$"
+PLAN_UPDATE_REGEX = r"^.+ started a plan\.$|" + \
+    r"^.+ named the plan .+\.$|" + \
+    r"^.+ deleted the plan for .+ at .+\.$"
 
 # matches chat updates (nicknames, emojis, colours, etc.)
-CHAT_UPDATE_REGEX = "^.+ set the emoji to .+\.$|" + \
-    "^.+ set your nickname to .+\.$|" + \
-    "^You set the nickname for .+ to .+\.$|" + \
-    "^.+ changed the chat colors\.?$"
+CHAT_UPDATE_REGEX = r"^.+ set the emoji to .+\.$|" + \
+    r"^.+ set your nickname to .+\.$|" + \
+    r"^You set the nickname for .+ to .+\.$|" + \
+    r"^.+ changed the chat colors\.?$"
 
 # matches call updates
-CALL_UPDATE_REGEX = "^You and .+ can now see each other\.$"
+CALL_UPDATE_REGEX = r"^You and .+ can now see each other\.$"
+
+# types the export itself gives messages written by Facebook rather than by a
+# sender, besides the types labelled by classifier
+EXPORT_SYSTEM_TYPES = ['Subscribe', 'Unsubscribe']
 
 # Facebook automatically converts these text emoticons to emojis
 EMOJI_SHORTCUTS = {
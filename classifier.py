@@ -0,0 +1,65 @@
+'''
+Classifier labels the system messages Facebook puts in a chat, like game scores
+and nickname changes
+
+Every registered pattern is combined into one regex, so each message is
+scanned once no matter how many system message types there are
+'''
+
+import re
+
+import chatstats_constants
+
+# (message type, regex) pairs, earlier types win when several match
+SYSTEM_MESSAGE_TYPES = [
+    ('Game', chatstats_constants.GAME_REGEX),
+    ('Plan Update', chatstats_constants.PLAN_UPDATE_REGEX),
+    ('Chat Update', chatstats_constants.CHAT_UPDATE_REGEX),
+    ('Call Update', chatstats_constants.CALL_UPDATE_REGEX),
+]
+
+_combined = None
+
+def register_message_type(message_type, regex):
+    '''
+    Adds a system message type, checked after the types already registered
+
+    The regex must not contain named groups
+    '''
+    global _combined
+    re.compile(regex)
+    SYSTEM_MESSAGE_TYPES.append((message_type, regex))
+    _combined = None
+
+def system_types():
+    '''
+    Returns every type of message written by Facebook rather than by a sender,
+    including registered types, which are not counted as turns in a conversation
+    '''
+    return [t for t, _ in SYSTEM_MESSAGE_TYPES] + chatstats_constants.EXPORT_SYSTEM_TYPES
+
+def combined_regex():
+    '''
+    Compiles every registered type into one alternation with a named group per type
+    '''
+    global _combined
+    if _combined is None:
+        _combined = re.compile("|".join(
+            "(?P<t{}>{})".format(i, regex) for i, (_, regex) in enumerate(SYSTEM_MESSAGE_TYPES)
+        ))
+    return _combined
+
+def classify(content):
+    '''
+    Returns the system message type of each message, or None for regular messages
+    '''
+    regex = combined_regex()
+    types = {"t{}".format(i): t for i, (t, _) in enumerate(SYSTEM_MESSAGE_TYPES)}
+
+    def label(text):
+        if not isinstance(text, str):
+            return None
+        match = regex.match(text)
+        return types[match.lastgroup] if match else None
+
+    return content.map(label)
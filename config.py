@@ -22,3 +22,63 @@ PALETTE = "muted"
 
 # padding around the plot image
 PAD_INCHES = 0.1
+
+# format graphs are saved in: "png", "svg" or "json"
+# "json" saves the data each graph plots instead of an image, to draw it elsewhere
+GRAPH_FORMAT = "png"
+
+# crop each image to what is drawn on it, which takes an extra layout pass
+# False saves faster, but cuts off legends and titles drawn outside the figure
+TIGHT_BBOX = True
+
+# save each thread's graphs in one graphs.zip instead of a file per graph
+ARCHIVE_GRAPHS = False
+
+# folder of extra fonts graphs can use, such as the EmojiOne font of the emoji graph
+FONT_FOLDER = "fonts"
+
+# stickers are shrunk to fit in a square of this many pixels before they are drawn
+STICKER_PIXELS = 128
+
+# shrunk stickers are kept here between runs
+ASSET_CACHE_FOLDER = "my_data/.assets"
+
+# number of worker processes used to parse the json shards of an export
+# None uses one per CPU
+INGEST_WORKERS = None
+
+# cache cleaned data in my_data/<thread_path>/.cache so unchanged chats are not reprocessed
+USE_CACHE = True
+
+# number of worker processes used to render graphs
+# None uses one per CPU
+RENDER_WORKERS = None
+
+# how to score distinguishing words
+# "sparse" ranks only each group's top words using a sparse matrix, "pandas" scores every word
+TFIDF_ENGINE = "sparse"
+
+# number of messages processed at a time with --stream
+STREAM_CHUNK_SIZE = 10000
+
+# number of conversations graphed at once by batch.py
+# None uses one per CPU
+BATCH_WORKERS = None
+
+# what distinguishing words are compared against
+# "thread" compares senders or terms within a chat, "inbox" compares against every chat
+# indexed by the last batch.py run, falling back to "thread" if there is no index
+TFIDF_CORPUS = "thread"
+
+# minutes without any message after which the next message starts a new conversation,
+# used to measure response times and who starts conversations
+SESSION_GAP_MINUTES = 60
+
+# port of the local server started by server.py
+SERVER_PORT = 8000
+
+# number of conversations server.py keeps in memory, dropping the least recently used
+SERVER_THREADS = 4
+
+# number of answers server.py keeps with each conversation in memory, dropping the least recently used
+SERVER_ANSWERS = 256
@@ -0,0 +1,79 @@
+'''
+Index of statistics across every conversation graphed by a batch run
+
+The index is built from the counts each conversation's run computed, so it
+never rescans the Facebook export. It holds:
+- threads: messages and words per thread
+- senders: messages per sender in each thread
+- vocabulary_<level>: for words, bigrams and trigrams, the total count of
+  each word and the number of threads it appears in
+'''
+
+import os
+
+import cache
+
+INDEX_FOLDER = "my_data/.index"
+
+LEVELS = ['words', 'bigrams', 'trigrams']
+
+def index_path(table):
+    return os.path.join(INDEX_FOLDER, "{}.parquet".format(table))
+
+def thread_statistics(thread_path, messages, words, bigrams, trigrams):
+    '''
+    Returns what the index keeps of one thread, from the counts its run computed
+    '''
+    senders = messages.groupby('sender_name').size().rename('messages').reset_index()
+    senders['thread_path'] = thread_path
+
+    vocabularies = dict()
+    for level, counts in zip(LEVELS, (words, bigrams, trigrams)):
+        counts = counts.groupby('word', observed=True)[['n_w']].sum().reset_index()
+        counts['word'] = counts['word'].astype(str)
+        vocabularies[level] = counts
+
+    return {
+        'thread': {'thread_path': thread_path, 'messages': len(messages), 'words': int(words['n_w'].sum())},
+        'senders': senders,
+        'vocabularies': vocabularies,
+    }
+
+def build_index(statistics):
+    '''
+    Builds the index from the thread_statistics of every thread in a batch run,
+    returning the number of threads indexed
+
+    Nothing is indexed without pyarrow, which the index is saved with
+    '''
+    import pandas as pd
+    if len(statistics) == 0 or not cache.available():
+        return 0
+
+    if not os.path.exists(INDEX_FOLDER):
+        os.makedirs(INDEX_FOLDER)
+
+    pd.DataFrame([s['thread'] for s in statistics]).to_parquet(index_path('threads'), index=False)
+    pd.concat([s['senders'] for s in statistics], ignore_index=True)[['thread_path', 'sender_name', 'messages']].to_parquet(
+        index_path('senders'), index=False
+    )
+    for level in LEVELS:
+        vocabulary = pd.concat([s['vocabularies'][level] for s in statistics], ignore_index=True).groupby('word').agg(
+            n_w=('n_w', 'sum'),
+            threads=('n_w', 'size')
+        ).reset_index()
+        vocabulary.to_parquet(index_path("vocabulary_{}".format(level)), index=False)
+    return len(statistics)
+
+def available():
+    return os.path.exists(index_path('threads'))
+
+def document_frequencies(level):
+    '''
+    Returns the number of indexed threads and the number of threads each word
+    of the n-gram level appears in, as util.tf_idf takes them
+    '''
+    import pandas as pd
+    threads = pd.read_parquet(index_path('threads'))
+    vocabulary = pd.read_parquet(index_path("vocabulary_{}".format(level)))
+    return len(threads), vocabulary.set_index('word')['threads']
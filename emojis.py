@@ -0,0 +1,87 @@
+'''
+Finds the emoji in text with a trie generated from the emoji library
+
+Emoji made of several code points, like skin tones, flags and sequences joined
+with zero width joiners, are matched whole, taking the longest emoji at each
+position as the emoji library's own regex does
+'''
+
+import re
+
+import emoji
+
+END = ''
+
+# code points this close together share one range of the start scan, fewer
+# ranges make the scan faster and the trie rejects the extra characters
+RANGE_GAP = 64
+
+_trie = None
+_starts = None
+
+def build_trie(words):
+    trie = {}
+    for word in words:
+        node = trie
+        for c in word:
+            node = node.setdefault(c, {})
+        node[END] = True
+    return trie
+
+def start_regex(chars):
+    '''
+    Returns a regex matching any of the characters, as a few coarse ranges
+    '''
+    ascii_chars = sorted(c for c in chars if c.isascii())
+    code_points = sorted(ord(c) for c in chars if not c.isascii())
+
+    ranges = [[code_points[0], code_points[0]]]
+    for code_point in code_points[1:]:
+        if code_point - ranges[-1][1] <= RANGE_GAP:
+            ranges[-1][1] = code_point
+        else:
+            ranges.append([code_point, code_point])
+
+    return re.compile("[{}{}]".format(
+        "".join(re.escape(c) for c in ascii_chars),
+        "".join("{}-{}".format(re.escape(chr(a)), re.escape(chr(b))) for a, b in ranges)
+    ))
+
+def emoji_trie():
+    '''
+    Builds the trie and the regex finding where emoji may start, on first use
+    '''
+    global _trie, _starts
+    if _trie is None:
+        _trie = build_trie(emoji.UNICODE_EMOJI)
+        _starts = start_regex(_trie)
+    return _trie, _starts
+
+def find_emoji(text):
+    '''
+    Returns every emoji in the text, in order
+    '''
+    # every emoji has a non-ascii code point
+    if text.isascii():
+        return []
+
+    trie, starts = emoji_trie()
+    found = list()
+    end = 0
+    length = len(text)
+    for match in starts.finditer(text):
+        start = match.start()
+        if start < end:
+            continue
+        node = trie
+        i = start
+        while i < length:
+            node = node.get(text[i])
+            if node is None:
+                break
+            i += 1
+            if END in node:
+                end = i
+        if end > start:
+            found.append(text[start:end])
+    return found
@@ -2,24 +2,96 @@
 Graphers turn dataframes into graphs
 '''
 
-import seaborn as sns
-import matplotlib.pyplot as plt
-from matplotlib.image import BboxImage
-from matplotlib.transforms import Bbox, TransformedBbox
+import io
+import json
+
 from slugify import slugify
 
+import assets
 import chatstats_constants
+import trends
 import util
 import config
 
+def plotting():
+    '''
+    Imports seaborn and pyplot when a graph is drawn, so runs where every
+    graph is unchanged do not pay for them
+    '''
+    import seaborn as sns
+    import matplotlib.pyplot as plt
+    return sns, plt
+
+def encode(figure, graph_format, title, plotted):
+    '''
+    Returns the bytes of a figure as a png or svg image, or for json the title
+    and the rows of plotted, the dataframe drawn on it
+    '''
+    if graph_format == 'json':
+        rows = json.loads(plotted.to_json(orient='records', date_format='iso'))
+        return json.dumps({'title': title, 'data': rows}).encode('utf-8')
+    buffer = io.BytesIO()
+    figure.savefig(
+        buffer,
+        format=graph_format,
+        bbox_inches='tight' if config.TIGHT_BBOX else None,
+        pad_inches=config.PAD_INCHES
+    )
+    return buffer.getvalue()
+
 class Grapher(object):
     '''
     Interface for Grapher, which reads a dataframe and outputs a graph
+
+    Word graphers read a util.WordData instead of a dataframe, trend graphers
+    a trends.TrendIndex and turn graphers a turns.TurnData
     '''
-    # outputs a graph bitmap to the output_folder
-    def graph(self, data, output_folder, parent_folder):
+    # (group, kind) groupings this grapher reads from its WordData, TrendIndex or TurnData,
+    # computed once before rendering and shared between graphers
+    aggregations = []
+
+    # title shown on the graph, which also names its file
+    # "{}" is replaced with the grapher's type
+    title = None
+
+    # draws a graph and passes it to save, with output the sinks.Sink to save it to,
+    # first passing the data it plots to save_data so json is saved without drawing
+    def graph(self, data, output, parent_folder):
         raise NotImplementedError( "Implement the graph function for a concrete Grapher" )
 
+    # whether there is nothing to graph, in which case graph is not called
+    def is_empty(self, data):
+        return False
+
+    # files drawn on the graph besides its data, such as images and fonts,
+    # so the graph is drawn again when they change
+    def asset_files(self, data, parent_folder):
+        return []
+
+    def graph_title(self):
+        return self.title.format(self.type)
+
+    def output_name(self, graph_format=config.GRAPH_FORMAT):
+        return "{}.{}".format(slugify(self.graph_title()), graph_format)
+
+    def save(self, figure, output, plotted):
+        '''
+        Writes the figure to output in its format and clears it, where plotted
+        is the dataframe drawn, saved instead of the image for json
+        '''
+        output.write(self.output_name(output.format), encode(figure, output.format, self.graph_title(), plotted))
+        figure.clf()
+
+    def save_data(self, output, plotted):
+        '''
+        Writes plotted to output if it saves json, returning whether it did so
+        graph stops before drawing a figure that would not be saved
+        '''
+        if output.format != 'json':
+            return False
+        output.write(self.output_name(output.format), encode(None, output.format, self.graph_title(), plotted))
+        return True
+
     def __init__(self, type=None):
         self.type = type
 
@@ -28,8 +100,14 @@ class SenderMessagesGraph(Grapher):
     '''
     Plots the number of messages sent by each sender
     '''
-    def graph(self, data, output_folder, parent_folder):
+    title = "Number of messages sent"
+
+    def graph(self, data, output, parent_folder):
         to_plot = data[config.SENDER_COLUMN_NAME].value_counts()
+        plotted = to_plot.rename_axis(config.SENDER_COLUMN_NAME).reset_index(name='messages')
+        if self.save_data(output, plotted):
+            return
+        sns, plt = plotting()
 
         sns.set(style="darkgrid")
         plot = sns.barplot(
@@ -51,22 +129,26 @@ class SenderMessagesGraph(Grapher):
                 va='bottom'
             )
 
-        TITLE = "Number of messages sent"
+        TITLE = self.graph_title()
         plt.suptitle(TITLE, y = 1)
         plot.set(xlabel='', ylabel='')
-        plot.get_figure().savefig(
-            "{}/{}.png".format(output_folder, slugify(TITLE)),
-            bbox_inches='tight',
-            pad_inches=config.PAD_INCHES
-        )
-        plot.get_figure().clf()
+        self.save(plot.get_figure(), output, plotted)
 
 class CallDurationGraph(Grapher):
     '''
     Plots the longest calls
     '''
-    def graph(self, data, output_folder, parent_folder):
+    title = "Longest calls"
+
+    def is_empty(self, data):
+        return not (data['type'] == 'Call').any()
+
+    def graph(self, data, output, parent_folder):
         data = data[data['type'] == 'Call'].sort_values('call_duration',ascending=False).head(10)
+        plotted = data[['date', 'call_duration']]
+        if self.save_data(output, plotted):
+            return
+        sns, plt = plotting()
 
         sns.set(style="darkgrid")
         plot = sns.barplot(
@@ -77,23 +159,24 @@ class CallDurationGraph(Grapher):
             palette = config.PALETTE
         )
 
-        TITLE = "Longest calls"
+        TITLE = self.graph_title()
         plt.suptitle(TITLE, y = 1)
         plot.set(ylabel="Day of call", xlabel="Call duration in seconds")
-        plot.get_figure().savefig(
-            "{}/{}.png".format(output_folder, slugify(TITLE)),
-            bbox_inches='tight',
-            pad_inches=config.PAD_INCHES
-        )
-        plot.get_figure().clf()
+        self.save(plot.get_figure(), output, plotted)
 
 class WeekdayMessagesGraph(Grapher):
     '''
     Plots the number of messages sent in each weekday
     '''
-    def graph(self, data, output_folder, parent_folder):
+    title = "Messages by weekday"
+
+    def graph(self, data, output, parent_folder):
         data['weekday'] = data['datetime'].dt.day_name()
         to_plot = data.groupby(['weekday', config.SENDER_COLUMN_NAME], as_index=False)[['type']].count()
+        plotted = to_plot.rename(columns={'type': 'messages'})
+        if self.save_data(output, plotted):
+            return
+        sns, plt = plotting()
 
         sns.set(style="darkgrid")
         plot = sns.barplot(
@@ -105,52 +188,55 @@ class WeekdayMessagesGraph(Grapher):
             palette = config.PALETTE
         )
 
-        TITLE = "Messages by weekday"
+        TITLE = self.graph_title()
         plt.suptitle(TITLE, y = 1)
         plot.set(xlabel='', ylabel='')
         plot.legend(bbox_to_anchor=(1.04,1), loc="upper left")
-        plot.get_figure().savefig(
-            "{}/{}.png".format(output_folder, slugify(TITLE)),
-            bbox_inches='tight',
-            pad_inches=config.PAD_INCHES
-        )
-        plot.get_figure().clf()
+        self.save(plot.get_figure(), output, plotted)
 
 class TopDaysMessagesGraph(Grapher):
     '''
     Plots the top 5 days with most messages
     '''
-    def graph(self, data, output_folder, parent_folder):
+    title = "Days with the most messages"
+
+    def graph(self, data, output, parent_folder):
         to_plot = data.groupby(['date', config.SENDER_COLUMN_NAME], as_index=False)[['type']].count()
+        top_days = to_plot.groupby('date').type.sum().sort_values(ascending=False).head(5).index
+        plotted = to_plot[to_plot['date'].isin(top_days)].rename(columns={'type': 'messages'})
+        if self.save_data(output, plotted):
+            return
+        sns, plt = plotting()
         sns.set(style="darkgrid")
         plot = sns.barplot(
             x=to_plot['date'],
             y=to_plot['type'],
             hue=to_plot[config.SENDER_COLUMN_NAME],
             data=to_plot,
-            order=to_plot.groupby('date').type.sum().sort_values(ascending=False).head(5).index,
+            order=top_days,
             palette = config.PALETTE
         )
-        TITLE = "Days with the most messages"
+        TITLE = self.graph_title()
         plt.suptitle(TITLE, y = 1)
         plot.set(xlabel='', ylabel='')
         plot.legend(bbox_to_anchor=(1.04,1), loc="upper left")
-        plot.get_figure().savefig(
-            "{}/{}.png".format(output_folder, slugify(TITLE)),
-            bbox_inches='tight',
-            pad_inches=config.PAD_INCHES
-        )
-        plot.get_figure().clf()
+        self.save(plot.get_figure(), output, plotted)
 
 class TimeInDayMessagesGraph(Grapher):
     '''
     Plots the frequency of messages for time in the day
     '''
-    def graph(self, data, output_folder, parent_folder):
+    title = "Messages by hour of day"
+
+    def graph(self, data, output, parent_folder):
         # get hour
         data['time'] = data['datetime'].dt.time.apply( lambda x: x.hour )
 
         to_plot = data.groupby(['time', config.SENDER_COLUMN_NAME], as_index=False)[['type']].count().sort_values('time')
+        plotted = to_plot.rename(columns={'type': 'messages'})
+        if self.save_data(output, plotted):
+            return
+        sns, plt = plotting()
 
         sns.set(style="darkgrid")
         plot = sns.barplot(
@@ -160,23 +246,24 @@ class TimeInDayMessagesGraph(Grapher):
             hue=config.SENDER_COLUMN_NAME,
             palette = config.PALETTE
         )
-        TITLE = "Messages by hour of day"
+        TITLE = self.graph_title()
         plt.suptitle(TITLE, y = 1)
         plot.set(xlabel='', ylabel='')
         plot.legend(bbox_to_anchor=(1.04,1), loc="upper left")
-        plot.get_figure().savefig(
-            "{}/{}.png".format(output_folder, slugify(TITLE)),
-            bbox_inches='tight',
-            pad_inches=config.PAD_INCHES
-        )
-        plot.get_figure().clf()
+        self.save(plot.get_figure(), output, plotted)
 
 class PerTermMessagesGraph(Grapher):
     '''
     Plots the frequency of messages for each 4 month term
     '''
-    def graph(self, data, output_folder, parent_folder):
+    title = "Messages by trimester"
+
+    def graph(self, data, output, parent_folder):
         to_plot = data.groupby(['term', config.SENDER_COLUMN_NAME], as_index=False)[['type']].count()
+        plotted = to_plot.rename(columns={'type': 'messages'})
+        if self.save_data(output, plotted):
+            return
+        sns, plt = plotting()
 
         sns.set(style="darkgrid")
         plot = sns.barplot(
@@ -188,24 +275,33 @@ class PerTermMessagesGraph(Grapher):
             palette = config.PALETTE
         )
 
-        TITLE = "Messages by trimester"
+        TITLE = self.graph_title()
         plt.suptitle(TITLE, y = 1)
         plot.set(xlabel='', ylabel='')
         plot.legend(bbox_to_anchor=(1.04,1), loc="upper left")
-
-        plot.get_figure().savefig(
-            "{}/{}.png".format(output_folder, slugify(TITLE)),
-            bbox_inches='tight',
-            pad_inches=config.PAD_INCHES
-        )
-        plot.get_figure().clf()
+        self.save(plot.get_figure(), output, plotted)
 
 class TopStickersMessagesGraph(Grapher):
     '''
     Plots the frequency of messages for time in the day
     '''
-    def graph(self, data, output_folder, parent_folder):
+    title = "Most frequent stickers"
+
+    def is_empty(self, data):
+        return data['sticker'].isnull().all()
+
+    def asset_files(self, data, parent_folder):
+        return ["{}/{}".format(parent_folder, sticker) for sticker in sorted(data['sticker'].dropna().unique())]
+
+    def graph(self, data, output, parent_folder):
         to_plot = data.groupby(['sticker', config.SENDER_COLUMN_NAME], as_index=False)[['type']].count()
+        top_stickers = to_plot.groupby('sticker').type.sum().sort_values(ascending=False).head(10).index
+        plotted = to_plot[to_plot['sticker'].isin(top_stickers)].rename(columns={'type': 'messages'})
+        if self.save_data(output, plotted):
+            return
+        sns, plt = plotting()
+        from matplotlib.image import BboxImage
+        from matplotlib.transforms import Bbox, TransformedBbox
 
         sns.set(style="darkgrid")
         plot = sns.barplot(
@@ -214,7 +310,7 @@ class TopStickersMessagesGraph(Grapher):
             hue=to_plot[config.SENDER_COLUMN_NAME],
             data=to_plot,
             hue_order=to_plot[config.SENDER_COLUMN_NAME].unique(),
-            order=to_plot.groupby('sticker').type.sum().sort_values(ascending=False).head(10).index,
+            order=top_stickers,
             palette = config.PALETTE
         )
 
@@ -239,34 +335,35 @@ class TopStickersMessagesGraph(Grapher):
         y = plot.patches[0].get_y()-2.5
         for file in sticker_files:
             try:
-                img =  plt.imread(file)
+                img = assets.sticker_image(file)
                 plotImage(x, y, img)
             except FileNotFoundError:
                 pass
             x += 1
 
-        TITLE = "Most frequent stickers"
+        TITLE = self.graph_title()
         plt.suptitle(TITLE, y = 1)
         plot.set(xlabel='', ylabel='', xticklabels=[])
         plot.legend(bbox_to_anchor=(1.04,1), loc="upper left")
         plot.xaxis.labelpad = 25
-        plot.get_figure().savefig(
-            "{}/{}.png".format(output_folder, slugify(TITLE)),
-            bbox_inches='tight',
-            pad_inches=config.PAD_INCHES
-        )
-        plot.get_figure().clf()
+        self.save(plot.get_figure(), output, plotted)
 
 class WordsPerMessageGraph(Grapher):
     '''
     Plots the average number of words per message
     '''
-    def graph(self, data, output_folder, parent_folder):
+    title = "Average number of words per message"
+
+    def graph(self, data, output, parent_folder):
         data['words'] = data.content.str.strip().str.split()
         data = data.dropna(subset=['words'])
         data = data[data['type'] == 'Generic']
         data['num_words'] = data['words'].apply(lambda x: len(x))
         to_plot = data.groupby([config.SENDER_COLUMN_NAME], as_index=False)[['num_words']].mean()
+        plotted = to_plot
+        if self.save_data(output, plotted):
+            return
+        sns, plt = plotting()
 
         sns.set(style="darkgrid")
         plot = sns.barplot(
@@ -288,23 +385,132 @@ class WordsPerMessageGraph(Grapher):
                 va='bottom'
             )
 
-        TITLE = "Average number of words per message"
+        TITLE = self.graph_title()
         plt.suptitle(TITLE, y = 1)
         plot.set(xlabel='', ylabel='')
+        self.save(plot.get_figure(), output, plotted)
+
+class ResponseTimeGraph(Grapher):
+    '''
+    Plots how long each sender usually takes to reply to someone else
+    '''
+    title = "Median response time in minutes"
+    aggregations = [('sender', 'response_time')]
+
+    def is_empty(self, data):
+        return len(data.grouped('sender', 'response_time')) == 0
+
+    def graph(self, data, output, parent_folder):
+        to_plot = data.grouped('sender', 'response_time')
+        plotted = to_plot
+        if self.save_data(output, plotted):
+            return
+        sns, plt = plotting()
+
+        sns.set(style="darkgrid")
+        plot = sns.barplot(
+            x=to_plot['sender'].to_numpy(),
+            y=to_plot['minutes'].to_numpy(),
+            order=to_plot['sender'].to_numpy(),
+            palette = config.PALETTE
+        )
+
+        # add number text above each bar
+        for rect, label in zip(plot.patches, to_plot['minutes'].tolist()):
+            height = rect.get_height()
+            plot.text(
+                rect.get_x() + rect.get_width()/2,
+                height, round(label, 1),
+                ha='center',
+                va='bottom'
+            )
+
+        TITLE = self.graph_title()
+        plt.suptitle(TITLE, y = 1)
+        plot.set(xlabel='', ylabel='')
+        self.save(plot.get_figure(), output, plotted)
+
+class ReplyMatrixGraph(Grapher):
+    '''
+    Plots how many times each sender replied to each other sender
+    '''
+    title = "Who replies to whom"
+
+    aggregations = [('sender', 'replies')]
+
+    def is_empty(self, data):
+        return data.grouped('sender', 'replies').values.sum() == 0
+
+    def graph(self, data, output, parent_folder):
+        to_plot = data.grouped('sender', 'replies')
+        plotted = to_plot.rename_axis('sender').reset_index()
+        if self.save_data(output, plotted):
+            return
+        sns, plt = plotting()
+
+        sns.set(style="darkgrid")
+        plot = sns.heatmap(
+            to_plot,
+            annot=True,
+            fmt="d",
+            cmap=sns.light_palette(sns.color_palette(config.PALETTE)[0], as_cmap=True)
+        )
+
+        TITLE = self.graph_title()
+        plt.suptitle(TITLE, y = 1)
+        plot.set(xlabel='Replied to', ylabel='Sender')
+        self.save(plot.get_figure(), output, plotted)
+
+class ConversationStartersGraph(Grapher):
+    '''
+    Plots the number of conversations each sender started after a silence
+    '''
+    title = "Conversations started"
+
+    aggregations = [('sender', 'starters')]
+
+    def is_empty(self, data):
+        return len(data.grouped('sender', 'starters')) == 0
 
-        plot.get_figure().savefig(
-            "{}/{}.png".format(output_folder, slugify(TITLE)),
-            bbox_inches='tight',
-            pad_inches=config.PAD_INCHES
+    def graph(self, data, output, parent_folder):
+        to_plot = data.grouped('sender', 'starters')
+        plotted = to_plot.rename(columns={'sender': config.SENDER_COLUMN_NAME})
+        if self.save_data(output, plotted):
+            return
+        sns, plt = plotting()
+
+        sns.set(style="darkgrid")
+        plot = sns.barplot(
+            x=to_plot['sender'].to_numpy(),
+            y=to_plot['conversations'].to_numpy(),
+            order=to_plot['sender'].to_numpy(),
+            palette = config.PALETTE
         )
-        plot.get_figure().clf()
+
+        # add number text above each bar
+        for rect, label in zip(plot.patches, to_plot['conversations'].tolist()):
+            height = rect.get_height()
+            plot.text(
+                rect.get_x() + rect.get_width()/2,
+                height + 0.5, label,
+                ha='center',
+                va='bottom'
+            )
+
+        TITLE = self.graph_title()
+        plt.suptitle(TITLE, y = 1)
+        plot.set(xlabel='', ylabel='')
+        self.save(plot.get_figure(), output, plotted)
 
 class WordCountGraph(Grapher):
     '''
     Plots the most common words
     '''
-    def graph(self, data, output_folder, parent_folder):
-        data = util.group_words_by_sender(data)
+    title = "Most common words"
+    aggregations = [('sender', 'counts')]
+
+    def graph(self, data, output, parent_folder):
+        data = data.by_sender()
         # words only
         data = data[data['type'] == 'word']
         # ignore contractions
@@ -321,6 +527,11 @@ class WordCountGraph(Grapher):
 
         # ignore numbers
         to_plot = to_plot[~to_plot.word.isin([str(x) for x in range(0,10)])]
+        top_words = to_plot.groupby('word').n_w.sum().sort_values(ascending=False).head(10).index
+        plotted = to_plot[to_plot['word'].isin(top_words)]
+        if self.save_data(output, plotted):
+            return
+        sns, plt = plotting()
 
         sns.set(style="darkgrid")
         plot = sns.barplot(
@@ -330,29 +541,31 @@ class WordCountGraph(Grapher):
             data=to_plot,
             palette = config.PALETTE,
             orient="h",
-            order=to_plot.groupby('word').n_w.sum().sort_values(ascending=False).head(10).index,
+            order=top_words,
         )
 
-        TITLE = "Most common words"
+        TITLE = self.graph_title()
         plt.suptitle(TITLE, y = 1)
         plot.set(xlabel='', ylabel='')
         plot.legend(bbox_to_anchor=(1.04,1), loc="upper left")
-        plot.get_figure().savefig(
-            "{}/{}.png".format(output_folder, slugify(TITLE)),
-            bbox_inches='tight',
-            pad_inches=config.PAD_INCHES
-        )
-        plot.get_figure().clf()
+        self.save(plot.get_figure(), output, plotted)
 
 class NameGraph(Grapher):
     '''
     Plot who says whose names
     '''
-    def graph(self, data, output_folder, parent_folder):
-        data = util.group_words_by_sender(data)
+    title = "Names said in chat"
+    aggregations = [('sender', 'counts')]
+
+    def graph(self, data, output, parent_folder):
+        data = data.by_sender()
         names = data[config.SENDER_COLUMN_NAME].unique().tolist()
         first_names = sorted([x.split()[0].lower() for x in names])
         to_plot = data[data['word'].isin(first_names)].groupby(['word', config.SENDER_COLUMN_NAME], as_index=False)[['n_w']].sum()
+        plotted = to_plot
+        if self.save_data(output, plotted):
+            return
+        sns, plt = plotting()
 
         sns.set(style="darkgrid")
         plot = sns.barplot(
@@ -363,24 +576,34 @@ class NameGraph(Grapher):
             palette = config.PALETTE,
         )
 
-        TITLE = "Names said in chat"
+        TITLE = self.graph_title()
         plt.suptitle(TITLE, y = 1)
         plot.set(xlabel='', ylabel='', xticklabels=["\"{}\"".format(x) for x in first_names])
         plot.legend(bbox_to_anchor=(1.04,1), loc="upper left")
-        plot.get_figure().savefig(
-            "{}/{}.png".format(output_folder, slugify(TITLE)),
-            bbox_inches='tight',
-            pad_inches=config.PAD_INCHES
-        )
-        plot.get_figure().clf()
+        self.save(plot.get_figure(), output, plotted)
 
 '''
 Plots the most common emojis
 '''
 class EmojiCountGraph(Grapher):
-    def graph(self, data, output_folder, parent_folder):
-        data = util.group_words_by_sender(data)
+    title = "Most frequent emoji"
+    aggregations = [('sender', 'counts')]
+
+    def is_empty(self, data):
+        return not (data.by_sender()['type'] == 'emoji').any()
+
+    def asset_files(self, data, parent_folder):
+        return assets.font_files()
+
+    def graph(self, data, output, parent_folder):
+        data = data.by_sender()
         to_plot = data[data['type'] == 'emoji']
+        top_emoji = to_plot.groupby('word')[['n_w']].sum().sort_values('n_w',ascending=False).head(10).index
+        plotted = to_plot[to_plot['word'].isin(top_emoji)]
+
+        if self.save_data(output, plotted):
+            return
+        sns, plt = plotting()
 
         sns.set(style="darkgrid")
         plot = sns.barplot(
@@ -389,41 +612,40 @@ class EmojiCountGraph(Grapher):
             hue=to_plot[config.SENDER_COLUMN_NAME],
             data=to_plot,
             palette = config.PALETTE,
-            order=to_plot.groupby('word')[['n_w']].sum().sort_values('n_w',ascending=False).head(10).index,
+            order=top_emoji,
         )
 
-        util.add_custom_fonts()
+        assets.register_fonts()
 
         for item in plot.get_xticklabels():
             item.set_family('EmojiOne')
             item.set_fontsize(20)
 
-        emojis = [x.get_text() for x in plot.get_xticklabels()]
-        print("Your top emojis:")
-        print("   ".join(["{}. {}".format(i+1, e) for i, e in enumerate(emojis)]))
-
-        TITLE = "Most frequent emoji"
+        TITLE = self.graph_title()
         plt.suptitle(TITLE, y = 1)
         plot.set(xlabel='', ylabel='')
         plot.legend(bbox_to_anchor=(1.04,1), loc="upper left")
-        plot.get_figure().savefig(
-            "{}/{}.png".format(output_folder, slugify(TITLE)),
-            bbox_inches='tight',
-            pad_inches=config.PAD_INCHES
-        )
-        plot.get_figure().clf()
+        self.save(plot.get_figure(), output, plotted)
 
 class SenderDistinguishingWordsGraph(Grapher):
     '''
     Plots the most distinctive words per sender
     '''
-    def graph(self, data, output_folder, parent_folder):
+    title = "Our Most Distinguishing {}"
+    aggregations = [('sender', 'distinguishing')]
+
+    def is_empty(self, data):
+        return len(data.distinguishing('sender')) == 0
+
+    def graph(self, data, output, parent_folder):
         if self.type == None:
             raise ValueError("Grapher type must be set to a string")
 
-        data = util.group_words_by_sender(data, get_tfidf=True)
-        data = data[data['word'].str.len() > 1]
-        data = data[data['type'] == 'word']
+        data = data.distinguishing('sender')
+        plotted = data.groupby(config.SENDER_COLUMN_NAME, sort=False).head(10)[[config.SENDER_COLUMN_NAME, 'word', 'tf_idf']]
+        if self.save_data(output, plotted):
+            return
+        sns, plt = plotting()
         senders = data[config.SENDER_COLUMN_NAME].unique().tolist()
         N = len(senders)
         rows, cols = util.get_rows_cols(N)
@@ -455,26 +677,29 @@ class SenderDistinguishingWordsGraph(Grapher):
                 xlabel="Distinctiveness Score"
             )
 
-        TITLE = "Our Most Distinguishing {}".format(self.type)
+        TITLE = self.graph_title()
         plt.suptitle(TITLE, y = 1.09, fontsize=20)
-        fig.savefig(
-            "{}/{}.png".format(output_folder, slugify(TITLE)),
-            bbox_inches='tight',
-            pad_inches=config.PAD_INCHES
-        )
-        fig.clf()
+        self.save(fig, output, plotted)
 
 class TermDistinguishingWordsGraph(Grapher):
     '''
     Plots the most distinctive words per term
     '''
-    def graph(self, data, output_folder, parent_folder):
+    title = "Each Term's Most Distinguishing {}"
+    aggregations = [('term', 'distinguishing')]
+
+    def is_empty(self, data):
+        return len(data.distinguishing('term')) == 0
+
+    def graph(self, data, output, parent_folder):
         if self.type == None:
             raise ValueError("Grapher type must be set to a string")
 
-        data = util.group_words_by_term(data, get_tfidf=True)
-        data = data[data['word'].str.len() > 1]
-        data = data[data['type'] == 'word']
+        data = data.distinguishing('term')
+        plotted = data.groupby('term', sort=False).head(10)[['term', 'word', 'tf_idf']]
+        if self.save_data(output, plotted):
+            return
+        sns, plt = plotting()
         terms = sorted(data.term.unique().tolist())
         N = len(terms)
         rows, cols = util.get_rows_cols(N)
@@ -506,22 +731,28 @@ class TermDistinguishingWordsGraph(Grapher):
                 xlabel="Distinctiveness Score"
             )
 
-        TITLE = "Each Term's Most Distinguishing {}".format(self.type)
+        TITLE = self.graph_title()
         plt.suptitle(TITLE, y = 1.09, fontsize=20)
-        fig.savefig(
-            "{}/{}.png".format(output_folder, slugify(TITLE)),
-            bbox_inches='tight',
-            pad_inches=config.PAD_INCHES
-        )
-        fig.clf()
+        self.save(fig, output, plotted)
 
 class HashtagGraph(Grapher):
     '''
     Plots the most used hashtags
     '''
-    def graph(self, data, output_folder, parent_folder):
-        data = util.group_words_by_sender(data)
+    title = "Most frequent hashtags"
+    aggregations = [('sender', 'counts')]
+
+    def is_empty(self, data):
+        return not (data.by_sender()['type'] == 'hashtag').any()
+
+    def graph(self, data, output, parent_folder):
+        data = data.by_sender()
         to_plot = data[data['type'] == 'hashtag']
+        top_hashtags = to_plot.groupby('word').n_w.sum().sort_values(ascending=False).head(10).index
+        plotted = to_plot[to_plot['word'].isin(top_hashtags)]
+        if self.save_data(output, plotted):
+            return
+        sns, plt = plotting()
 
         sns.set(style="darkgrid")
         plot = sns.barplot(
@@ -531,19 +762,59 @@ class HashtagGraph(Grapher):
             data=to_plot,
             palette = config.PALETTE,
             orient="h",
-            order=to_plot.groupby('word').n_w.sum().sort_values(ascending=False).head(10).index,
+            order=top_hashtags,
         )
 
-        TITLE = "Most frequent hashtags"
+        TITLE = self.graph_title()
         plt.suptitle(TITLE, y = 1)
         plot.set(xlabel='', ylabel='')
         plot.legend(bbox_to_anchor=(1.04,1), loc="upper left")
-        plot.get_figure().savefig(
-            "{}/{}.png".format(output_folder, slugify(TITLE)),
-            bbox_inches='tight',
-            pad_inches=config.PAD_INCHES
+        self.save(plot.get_figure(), output, plotted)
+
+class RisingWordsGraph(Grapher):
+    '''
+    Plots the use of the words that rose the most from one month to the next,
+    over every month of the chat
+    '''
+    title = "Words on the rise"
+    aggregations = [('month', 'counts'), ('month', 'rising')]
+
+    def is_empty(self, data):
+        return len(data.grouped('month', 'rising')) == 0
+
+    def graph(self, data, output, parent_folder):
+        rising = data.grouped('month', 'rising').sort_values('change', ascending=False)
+        words = rising.drop_duplicates('word').head(trends.TREND_GRAPH_WORDS)['word'].tolist()
+        counts = data.series(words, 'month')
+        plotted = counts.rename_axis('month').reset_index().melt(id_vars='month', var_name='word', value_name='n_w')
+        if self.save_data(output, plotted):
+            return
+        sns, plt = plotting()
+        months = counts.index.tolist()
+        to_plot = counts.reset_index(drop=True).reset_index().melt(id_vars='index', var_name='word', value_name='n_w')
+
+        sns.set(style="darkgrid")
+        fig, plot = plt.subplots()
+        sns.lineplot(
+            data=to_plot,
+            x='index',
+            y='n_w',
+            hue='word',
+            hue_order=words,
+            palette = config.PALETTE,
+            ax=plot
         )
-        plot.get_figure().clf()
+
+        # label about a dozen months
+        step = max(1, len(months) // 12)
+        plot.set_xticks(range(0, len(months), step))
+        plot.set_xticklabels(months[::step], rotation=45, ha='right')
+
+        TITLE = self.graph_title()
+        fig.suptitle(TITLE, y = 1)
+        plot.set(xlabel='', ylabel='')
+        plot.legend(bbox_to_anchor=(1.04,1), loc="upper left")
+        self.save(fig, output, plotted)
 
 
 message_graphers = [
@@ -556,6 +827,12 @@ message_graphers = [
     WordsPerMessageGraph(),
 ]
 
+turn_graphers = [
+    ResponseTimeGraph(),
+    ReplyMatrixGraph(),
+    ConversationStartersGraph(),
+]
+
 word_graphers = [
     EmojiCountGraph(),
     NameGraph(),
@@ -574,6 +851,10 @@ trigram_graphers = [
     TermDistinguishingWordsGraph("Trigrams"),
 ]
 
+trend_graphers = [
+    RisingWordsGraph(),
+]
+
 # Unused:
 # CallDurationGraph(),
 # WordCountGraph(),
@@ -0,0 +1,178 @@
+'''
+Loaders read a Facebook message export into dataframes
+
+pandas is imported by the functions that need it, so commands that only
+list or describe chats start quickly
+'''
+
+import os
+import re
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+import config
+
+CHAT_FILE = "message.json"
+SHARD_REGEX = re.compile(r'^message_(\d+)\.json$')
+
+class EmptyThread(ValueError):
+    '''
+    Raised for a thread whose shards hold no messages, which Facebook exports
+    for some deleted or never started chats
+    '''
+    def __init__(self, chat_folder):
+        super().__init__("No messages found in {}".format(chat_folder))
+
+def chat_folder_path(message_arg):
+    '''
+    Returns the chat folder for a path to either the folder or its message.json
+    '''
+    if message_arg.endswith(CHAT_FILE):
+        return message_arg[:-len(CHAT_FILE)]
+    if not message_arg.endswith("/"):
+        return "{}/".format(message_arg)
+    return message_arg
+
+def thread_path(chat_folder):
+    '''
+    Returns the thread path of a chat folder, e.g. "inbox/name_abc123"
+
+    This matches the "thread_path" of the export without having to parse it
+    '''
+    chat_folder = os.path.normpath(chat_folder)
+    return "{}/{}".format(os.path.basename(os.path.dirname(chat_folder)), os.path.basename(chat_folder))
+
+def find_threads(inbox_folder):
+    '''
+    Returns the chat folder of every thread under a folder such as messages/inbox,
+    largest first
+    '''
+    threads = list()
+    for folder, _, files in os.walk(inbox_folder):
+        shards = [f for f in files if SHARD_REGEX.match(f)]
+        if len(shards) > 0:
+            size = sum(os.path.getsize(os.path.join(folder, f)) for f in shards)
+            threads.append((size, chat_folder_path(folder)))
+    return [folder for size, folder in sorted(threads, key=lambda t: (-t[0], t[1]))]
+
+def shard_order(file):
+    match = SHARD_REGEX.match(file)
+    return (int(match.group(1)) if match else float('inf'), file)
+
+def shard_files(chat_folder):
+    '''
+    Returns the paths of the export's json shards, ordered by shard number
+    '''
+    files = [
+        file for file in os.listdir(chat_folder)
+        if file.endswith(".json") and file != CHAT_FILE
+    ]
+    return [os.path.join(chat_folder, file) for file in sorted(files, key=shard_order)]
+
+def read_shard(path):
+    '''
+    Parses one shard into its thread metadata and a dataframe of its messages
+    '''
+    import pandas as pd
+    with open(path) as f:
+        data = json.load(f)
+    messages = pd.DataFrame(data.pop("messages"))
+    return data, messages
+
+def load_thread(chat_folder, jobs=config.INGEST_WORKERS):
+    '''
+    Parses every shard of a thread in parallel
+
+    Returns the metadata of the first shard and one dataframe of all messages,
+    in shard order. Raises EmptyThread if no shard has any messages
+    '''
+    import pandas as pd
+    files = shard_files(chat_folder)
+    if len(files) == 0:
+        raise ValueError("No message json files found in {}".format(chat_folder))
+
+    workers = min(jobs or os.cpu_count() or 1, len(files))
+    if workers == 1:
+        shards = [read_shard(file) for file in files]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            shards = list(pool.map(read_shard, files))
+
+    metadata = shards[0][0]
+    messages = pd.concat([s[1] for s in shards], ignore_index=True, sort=False)
+    if len(messages) == 0:
+        raise EmptyThread(chat_folder)
+    return metadata, messages
+
+def iter_shard_chunks(path, chunk_size):
+    '''
+    Yields dataframes of at most chunk_size messages from one shard
+
+    With ijson installed the shard is parsed incrementally, otherwise it is
+    loaded whole, which Facebook keeps to about 10000 messages per shard
+    '''
+    import pandas as pd
+    try:
+        import ijson
+    except ImportError:
+        _, messages = read_shard(path)
+        for start in range(0, len(messages), chunk_size):
+            yield messages.iloc[start:start + chunk_size].reset_index(drop=True)
+        return
+
+    with open(path, 'rb') as f:
+        chunk = list()
+        for message in ijson.items(f, 'messages.item', use_float=True):
+            chunk.append(message)
+            if len(chunk) == chunk_size:
+                yield pd.DataFrame(chunk)
+                chunk = list()
+        if len(chunk) > 0:
+            yield pd.DataFrame(chunk)
+
+def iter_message_chunks(chat_folder, chunk_size=config.STREAM_CHUNK_SIZE):
+    '''
+    Yields dataframes of at most chunk_size messages, in shard order
+    '''
+    for file in shard_files(chat_folder):
+        for chunk in iter_shard_chunks(file, chunk_size):
+            yield chunk
+
+def load_new_messages(chat_folder, after_ms):
+    '''
+    Returns a dataframe of the messages sent after the given timestamp
+
+    Facebook writes the newest messages to message_1.json, so shards are read
+    in order until one reaches messages at or before the timestamp
+    '''
+    import pandas as pd
+    new_messages = list()
+    for file in shard_files(chat_folder):
+        _, messages = read_shard(file)
+        # empty shards have no columns at all
+        if len(messages) == 0:
+            continue
+        new_messages.append(messages[messages['timestamp_ms'] > after_ms])
+        if (messages['timestamp_ms'] <= after_ms).any():
+            break
+    if len(new_messages) == 0:
+        return pd.DataFrame()
+    return pd.concat(new_messages, ignore_index=True, sort=False)
+
+def merge_export(chat_folder):
+    '''
+    Writes every shard's messages into a single message.json in the chat folder
+    '''
+    json_template = {}
+    result_messages = []
+    for file in shard_files(chat_folder):
+        with open(file) as f:
+            data = json.load(f)
+            if len(json_template) == 0:
+                json_template = data
+            result_messages += data["messages"]
+
+    json_template['messages'] = result_messages
+
+    with open(os.path.join(chat_folder, CHAT_FILE), 'w') as f:
+        f.write(json.dumps(json_template, indent=2))
@@ -0,0 +1,73 @@
+'''
+Mojibake repairs the text of Facebook exports, which write utf-8 bytes as if
+each byte were a latin-1 character
+
+Undoing that takes one encode and decode per message. ftfy is only used for
+text the direct fix cannot handle or that ftfy would change further, such as
+curly quotes, html entities or text that still looks garbled after the fix
+'''
+
+import re
+import unicodedata
+
+import ftfy
+from ftfy.badness import is_bad, MOJIBAKE_CATEGORIES
+
+# characters ftfy may change in otherwise clean text
+NEEDS_FTFY = re.compile("[" + "".join([
+    # html entities, line breaks and control characters
+    r"&\r\x00-\x08\x0b\x0c\x0e-\x1f\u206a-\u206f\ufeff\ufff9-\ufffc",
+    # c1 control characters
+    r"\x7f-\x9f",
+    # curly quotes, dashes and other punctuation
+    r"\u02bc\u2010-\u2027\u2030-\u203a\u2032-\u2037",
+    # latin ligatures and full width forms
+    r"\u0132\u0133\u0149\u01c4-\u01cc\u01f1-\u01f3\ufb00-\ufb06\u3000\uff00-\uffef",
+    # replacement characters and lone surrogates
+    r"\ufffd\ud800-\udfff",
+]) + "]")
+
+# every pattern of ftfy's badness check has one of these characters, so text
+# without any, like most text with emoji, is never bad
+MAYBE_BAD = re.compile("[" + "".join(MOJIBAKE_CATEGORIES.values()) + "]")
+
+# c1 control characters are bad on their own, and every emoji garbled by
+# Facebook's encoding has one
+C1_CONTROL = re.compile("[\x80-\x9f]")
+
+def looks_bad(text):
+    if C1_CONTROL.search(text) is not None:
+        return True
+    return MAYBE_BAD.search(text) is not None and is_bad(text)
+
+def looks_garbled(text):
+    '''
+    Whether ftfy would try to fix the encoding of every line of the text,
+    as ftfy fixes each line on its own
+    '''
+    return all(looks_bad(line) for line in text.split("\n") if not line.isascii())
+
+def repair_text(text):
+    '''
+    Returns the text as ftfy would fix it
+    '''
+    if text.isascii():
+        fixed = text
+    else:
+        try:
+            fixed = text.encode('latin-1').decode('utf-8')
+        except UnicodeError:
+            return ftfy.ftfy(text)
+        # ftfy stops fixing the encoding once the text no longer looks garbled
+        if not looks_garbled(text) or looks_bad(fixed):
+            return ftfy.ftfy(text)
+
+    if NEEDS_FTFY.search(fixed) is None and unicodedata.is_normalized('NFC', fixed):
+        return fixed
+    return ftfy.ftfy(text)
+
+def repair(content):
+    '''
+    Repairs every string of a series, leaving other values as they are
+    '''
+    return content.map(lambda x: repair_text(x) if type(x) == str else x)
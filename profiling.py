@@ -0,0 +1,165 @@
+'''
+Profiling records the wall time, CPU time, peak memory and row count of each
+stage of a run, and can save a cProfile of each stage
+
+Peak memory is measured per stage on Linux, by resetting the process's peak
+when each stage starts. Elsewhere only the peak of the whole process so far
+is known, which is recorded as process_peak_rss_mb instead
+
+Stages are recorded only while a trace is started, otherwise stage() costs
+nothing. Stages do not nest, as only one cProfile can run at a time
+'''
+
+import os
+import json
+import time
+import cProfile
+from contextlib import contextmanager
+from slugify import slugify
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, where peak memory is not recorded
+    resource = None
+
+TRACE_FILE = "trace.json"
+
+_trace = None
+
+class Trace(object):
+    def __init__(self, profile_folder=None):
+        self.stages = list()
+        self.profile_folder = profile_folder
+        self.started = time.time()
+        self.wall_time = time.perf_counter()
+        self.cpu_time = cpu_time()
+        # highest stage peak so far, as resetting the peak forgets earlier ones
+        self.peak_rss_mb = 0
+
+def start(profile_folder=None):
+    '''
+    Starts recording stages, saving a cProfile of each one to profile_folder if given
+    '''
+    global _trace
+    if profile_folder is not None and not os.path.exists(profile_folder):
+        os.makedirs(profile_folder)
+    _trace = Trace(profile_folder)
+
+def settings():
+    '''
+    Returns the arguments to start a matching trace in a worker process, or
+    None if no trace is started
+    '''
+    if _trace is None:
+        return None
+    return {'profile_folder': _trace.profile_folder}
+
+def cpu_time():
+    '''
+    CPU time of this process and of the worker processes it has waited for
+    '''
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if os.uname().sysname == 'Darwin' else 1024), 1)
+
+def reset_peak_rss():
+    '''
+    Resets the peak memory of this process to its current memory, returning
+    whether it could, which only Linux allows
+    '''
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+@contextmanager
+def stage(name):
+    '''
+    Records a stage of the run, yielding a dict where the stage can set 'rows'
+    '''
+    record = {'name': name}
+    if _trace is None:
+        yield record
+        return
+
+    profiler = cProfile.Profile() if _trace.profile_folder is not None else None
+    per_stage_peak = reset_peak_rss()
+    wall_start = time.perf_counter()
+    cpu_start = cpu_time()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield record
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        record['wall_time'] = round(time.perf_counter() - wall_start, 6)
+        record['cpu_time'] = round(cpu_time() - cpu_start, 6)
+        peak = peak_rss_mb()
+        if per_stage_peak:
+            record['peak_rss_mb'] = peak
+            _trace.peak_rss_mb = max(_trace.peak_rss_mb, peak or 0)
+        else:
+            record['process_peak_rss_mb'] = peak
+        record['pid'] = os.getpid()
+        if profiler is not None:
+            # worker processes share the folder, so files are named by process
+            record['profile'] = os.path.join(_trace.profile_folder, "{}-{:04d}-{}.prof".format(
+                os.getpid(), len(_trace.stages), slugify(name)
+            ))
+            profiler.dump_stats(record['profile'])
+        _trace.stages.append(record)
+
+def take():
+    '''
+    Returns and clears the stages recorded so far, to send them from a worker
+    '''
+    if _trace is None:
+        return []
+    stages = _trace.stages
+    _trace.stages = list()
+    return stages
+
+def add(stages):
+    '''
+    Adds stages recorded by a worker process
+    '''
+    if _trace is not None:
+        _trace.stages.extend(stages)
+
+def summary(n=10):
+    '''
+    Returns lines describing the n slowest stages
+    '''
+    stages = sorted(_trace.stages, key=lambda s: -s['wall_time'])[:n]
+    return [
+        "{:>8.3f}s wall {:>8.3f}s cpu  {}{}".format(
+            s['wall_time'], s['cpu_time'], s['name'],
+            " ({} rows)".format(s['rows']) if s.get('rows') is not None else ""
+        )
+        for s in stages
+    ]
+
+def write(path):
+    '''
+    Saves the trace as json and stops recording
+    '''
+    global _trace
+    with open(path, 'w') as f:
+        json.dump({
+            'started': time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(_trace.started)),
+            'wall_time': round(time.perf_counter() - _trace.wall_time, 6),
+            'cpu_time': round(cpu_time() - _trace.cpu_time, 6),
+            'peak_rss_mb': max(_trace.peak_rss_mb, peak_rss_mb() or 0),
+            'stages': _trace.stages,
+        }, f, indent=2)
+    _trace = None
@@ -0,0 +1,233 @@
+'''
+Renders graphers, spread across worker processes when there is more than one CPU
+
+Graphs are saved to a sinks.Sink. A manifest saved with them records a hash of
+each grapher's input for each format, so graphs whose input has not changed
+since the last run in that format are not drawn again
+'''
+
+import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+import assets
+import cache
+import config
+import profiling
+import sinks
+
+MANIFEST_FILE = "manifest.json"
+
+# bump when graphers change how they draw
+RENDER_VERSION = 3
+
+# config values that change how graphs are drawn
+CONFIG_KEYS = ['SENDER_COLUMN_NAME', 'PALETTE', 'PAD_INCHES', 'TIGHT_BBOX', 'SESSION_GAP_MINUTES', 'STICKER_PIXELS']
+
+# the dataframes graphed by this worker process, set once by init_worker
+_datasets = None
+
+def init_worker(datasets, graph_format, profiling_settings=None):
+    '''
+    Gives each worker its own copy of the data, rendering off-screen with the
+    Agg backend unless it only saves json
+    '''
+    global _datasets
+    if profiling_settings is not None:
+        profiling.start(**profiling_settings)
+    _datasets = datasets
+    if graph_format == 'json':
+        return
+    import matplotlib
+    matplotlib.use('Agg')
+    import seaborn as sns
+    # the style the serial run sets before drawing
+    sns.set(style="darkgrid")
+
+def render_task(grapher, dataset, graph_format, parent_folder):
+    '''
+    Draws one graph in a worker, returning its files for the main process to
+    save and the stages it recorded
+    '''
+    output = sinks.MemorySink(graph_format)
+    draw_graph(grapher, _datasets[dataset], output, parent_folder)
+    return output.files, profiling.take()
+
+def draw_graph(grapher, data, output, parent_folder):
+    '''
+    Draws one graph on a new figure, closing every figure afterwards so no
+    graph depends on the graphs drawn before it in this process
+
+    json is saved before anything is drawn, so no figure is made for it
+    '''
+    with profiling.stage("render {}".format(grapher.output_name(output.format))) as record:
+        if len(grapher.aggregations) > 0:
+            record['rows'] = sum(len(data.grouped(group, kind)) for group, kind in grapher.aggregations)
+        else:
+            record['rows'] = len(data)
+        if output.format == 'json':
+            grapher.graph(data, output, parent_folder)
+            return
+
+        import matplotlib.pyplot as plt
+        plt.figure()
+        try:
+            grapher.graph(data, output, parent_folder)
+        finally:
+            plt.close('all')
+
+def prepare_aggregations(tasks, datasets):
+    '''
+    Computes each grouping of word data that graphers read, once per run
+    '''
+    for grapher, dataset in tasks:
+        for group, kind in grapher.aggregations:
+            if (group, kind) in datasets[dataset].groups:
+                continue
+            with profiling.stage("aggregate {} by {} ({})".format(dataset, group, kind)) as record:
+                record['rows'] = len(datasets[dataset].grouped(group, kind))
+
+def frame_digest(frame):
+    import pandas as pd
+    hashes = pd.util.hash_pandas_object(frame, index=False).values
+    return hashlib.sha1(json.dumps(list(frame.columns)).encode('utf-8') + hashes.tobytes()).hexdigest()
+
+def input_digest(grapher, dataset, datasets, digests, parent_folder):
+    '''
+    Hashes what a grapher reads along with the config it draws with and the
+    files of the assets it draws
+
+    digests holds the hash of each input already hashed in this run, as
+    many graphers share one
+    '''
+    if len(grapher.aggregations) > 0:
+        inputs = [(dataset, group, kind) for group, kind in grapher.aggregations]
+    else:
+        inputs = [(dataset,)]
+
+    for key in inputs:
+        if key not in digests:
+            if len(key) == 1:
+                digests[key] = frame_digest(cache.slim_messages(datasets[dataset]))
+            else:
+                digests[key] = frame_digest(datasets[dataset].grouped(key[1], key[2]))
+
+    return cache.digest({
+        'version': RENDER_VERSION,
+        'config': {k: getattr(config, k) for k in CONFIG_KEYS},
+        'title': grapher.graph_title(),
+        'inputs': [digests[key] for key in inputs],
+        'assets': assets.file_stats(grapher.asset_files(datasets[dataset], parent_folder)),
+    })
+
+def read_manifest(output):
+    '''
+    Returns the manifest in the output sink, with an entry for each graph by
+    format and then file name
+    '''
+    content = output.read(MANIFEST_FILE)
+    try:
+        manifest = json.loads(content.decode('utf-8')) if content is not None else {}
+    except ValueError:
+        return {}
+    # manifests of earlier versions were not split by format
+    return {f: e for f, e in manifest.items() if f in sinks.FORMATS and isinstance(e, dict)}
+
+def plan_renders(tasks, datasets, output, parent_folder, use_manifest=True):
+    '''
+    Returns the tasks whose graphs in the output sink need drawing, and the
+    new manifest entries of the output's format
+
+    Graphers with nothing to graph are skipped with a note, and marked empty
+    in the manifest
+    '''
+    old_manifest = read_manifest(output).get(output.format, {}) if use_manifest else {}
+    manifest = dict()
+    digests = dict()
+    pending = list()
+    for grapher, dataset in tasks:
+        name = grapher.output_name(output.format)
+        if grapher.is_empty(datasets[dataset]):
+            print("Skipped \"{}\", there is nothing to graph".format(grapher.graph_title()))
+            manifest[name] = {'empty': True}
+            continue
+
+        manifest[name] = {'digest': input_digest(grapher, dataset, datasets, digests, parent_folder)}
+        if old_manifest.get(name) != manifest[name] or not output.exists(name):
+            pending.append((grapher, dataset))
+    return pending, manifest
+
+def render_graphs(tasks, datasets, output, parent_folder, jobs=config.RENDER_WORKERS, use_manifest=True):
+    '''
+    Runs every (grapher, dataset name) task, where datasets maps names to the
+    dataframe or util.WordData to graph, saving the graphs to the output sink
+
+    Graphs unchanged since the last run are skipped unless use_manifest is False
+    '''
+    prepare_aggregations(tasks, datasets)
+    with profiling.stage('hash graph inputs') as record:
+        record['rows'] = len(tasks)
+        tasks, manifest = plan_renders(tasks, datasets, output, parent_folder, use_manifest)
+
+    # graphs from an earlier run that now have nothing to graph
+    for name, entry in manifest.items():
+        if entry.get('empty'):
+            output.remove(name)
+    # entries of the other formats stay, as their graphs are left as they are
+    manifests = read_manifest(output)
+    manifests[output.format] = manifest
+    # remove the old manifest first so graphs are redrawn if rendering fails
+    output.remove(MANIFEST_FILE)
+    draw(tasks, datasets, output, parent_folder, jobs)
+    output.write(MANIFEST_FILE, json.dumps(manifests, indent=2, sort_keys=True).encode('utf-8'))
+
+def render_graph(grapher, dataset, datasets, output, parent_folder, saved=None):
+    '''
+    Draws one graph to the output sink in this process, returning its content,
+    or None if there is nothing to graph
+
+    saved is a sink holding the graphs of an earlier run, whose copy of the
+    graph is returned instead if its input has not changed since
+    '''
+    name = grapher.output_name(output.format)
+    if grapher.is_empty(datasets[dataset]):
+        return None
+
+    prepare_aggregations([(grapher, dataset)], datasets)
+    if saved is not None and saved.format == output.format:
+        pending, manifest = plan_renders([(grapher, dataset)], datasets, saved, parent_folder)
+        if len(pending) == 0:
+            return saved.read(name)
+
+    draw([(grapher, dataset)], datasets, output, parent_folder, 1)
+    return output.read(name)
+
+def draw(tasks, datasets, output, parent_folder, jobs):
+    if len(tasks) == 0:
+        return
+
+    workers = min(jobs or os.cpu_count() or 1, len(tasks))
+    if workers <= 1:
+        # set here as the grapher that would set it first may have been skipped
+        if output.format != 'json':
+            import seaborn as sns
+            sns.set(style="darkgrid")
+        for grapher, dataset in tasks:
+            draw_graph(grapher, datasets[dataset], output, parent_folder)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_worker,
+        initargs=(datasets, output.format, profiling.settings())
+    ) as pool:
+        futures = [
+            pool.submit(render_task, grapher, dataset, output.format, parent_folder)
+            for grapher, dataset in tasks
+        ]
+        for future in futures:
+            files, stages = future.result()
+            for name, content in files.items():
+                output.write(name, content)
+            profiling.add(stages)
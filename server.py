@@ -0,0 +1,328 @@
+'''
+Serves the statistics of processed conversations over http, for a web UI
+
+Usage: python3 server.py [--port 8000] [--facebook-folder <folder>]
+
+Conversations are read from the cache that chatstats.py and batch.py leave in
+my_data, so run one of them first. The most recently used conversations stay
+in memory, and their most recent answers are kept with them, so repeated
+requests do not touch the disk:
+
+GET /threads                                     processed conversations, largest first
+GET /threads/<thread_path>/summary               messages, words, senders and dates
+GET /threads/<thread_path>/words?top=20&sender=  most used words (level=bigrams or trigrams for n-grams)
+GET /threads/<thread_path>/emoji?top=20&sender=  most used emoji
+GET /threads/<thread_path>/hours?sender=         messages sent in each hour of the day
+GET /threads/<thread_path>/tfidf?group=sender    most distinguishing words of each sender or term
+GET /threads/<thread_path>/trends?words=a,b      use of words in each month (bucket=day, week or term)
+GET /threads/<thread_path>/movers?bucket=month   words that rose the most each month (direction=falling)
+GET /threads/<thread_path>/graphs                graphs of the conversation
+GET /threads/<thread_path>/graphs/<file>.png     a graph (.svg, or .json for the data it plots)
+
+Graphs are drawn in memory, unless the copy saved with the conversation is
+unchanged, so the server never writes to my_data
+'''
+
+import os
+import sys
+import json
+import argparse
+import traceback
+from collections import OrderedDict
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, unquote
+
+import cache
+import config
+import corpus
+import sinks
+
+DATA_FOLDER = "my_data"
+
+class NotFound(Exception):
+    pass
+
+def cached_threads():
+    '''
+    Returns the path and message count of every processed conversation, largest first
+    '''
+    threads = list()
+    for folder, subfolders, files in os.walk(DATA_FOLDER):
+        if cache.stored_fingerprint(folder) is not None:
+            threads.append({
+                'thread_path': os.path.relpath(folder, DATA_FOLDER).replace(os.sep, '/'),
+                'messages': cache.cached_messages(folder),
+            })
+        # caches, profiles and the batch index hold no conversations
+        subfolders[:] = [f for f in subfolders if not f.startswith('.') and f != 'profile']
+    return sorted(threads, key=lambda t: (-t['messages'], t['thread_path']))
+
+class LoadedThread(object):
+    '''
+    The cached data of a conversation, with the most recently used answers
+    computed from it
+    '''
+    def __init__(self, thread_path, limit=config.SERVER_ANSWERS):
+        import chatstats
+        self.thread_path = thread_path
+        self.limit = limit
+        self.output_folder = os.path.join(DATA_FOLDER, thread_path)
+        self.fingerprint = cache.stored_fingerprint(self.output_folder)
+        data = cache.load(self.output_folder) if self.fingerprint is not None else None
+        if data is None:
+            raise NotFound("{} has not been processed, run chatstats.py on it first".format(thread_path))
+        self.datasets = chatstats.thread_datasets(*data)
+        self.answers = OrderedDict()
+
+    def answer(self, key, compute):
+        '''
+        Returns the answer kept under key, computing it with compute if it is
+        not kept, and drops the least recently used answers over the limit
+        '''
+        if key not in self.answers:
+            self.answers[key] = compute()
+        self.answers.move_to_end(key)
+        while len(self.answers) > self.limit:
+            self.answers.popitem(last=False)
+        return self.answers[key]
+
+class Threads(object):
+    '''
+    Loaded conversations, keeping only the most recently used ones, each with
+    at most answers answers
+    '''
+    def __init__(self, limit=config.SERVER_THREADS, answers=config.SERVER_ANSWERS):
+        self.limit = limit
+        self.answers = answers
+        self.loaded = OrderedDict()
+
+    def get(self, thread_path):
+        if os.path.isabs(thread_path) or os.path.normpath(thread_path).split(os.sep)[0] in ('..', '.'):
+            raise NotFound("{} is not a conversation".format(thread_path))
+
+        thread = self.loaded.get(thread_path)
+        # conversations processed again since they were loaded are read again
+        if thread is not None and thread.fingerprint != cache.stored_fingerprint(thread.output_folder):
+            thread = None
+        if thread is None:
+            thread = LoadedThread(thread_path, self.answers)
+            self.loaded[thread_path] = thread
+
+        self.loaded.move_to_end(thread_path)
+        while len(self.loaded) > self.limit:
+            self.loaded.popitem(last=False)
+        return thread
+
+def param(params, name, default=None, kind=str, choices=None):
+    '''
+    Returns a query parameter, raising ValueError if it is not valid
+    '''
+    if name not in params:
+        return default
+    value = kind(params[name][0])
+    if choices is not None and value not in choices:
+        raise ValueError("{} must be one of {}".format(name, ", ".join(choices)))
+    return value
+
+def summary(thread, params):
+    import chatstats
+    return chatstats.thread_summary(
+        thread.thread_path,
+        thread.output_folder,
+        thread.datasets['messages'],
+        thread.datasets['words'].words
+    )
+
+def top_words(thread, params, word_type='word'):
+    level = param(params, 'level', 'words', choices=corpus.LEVELS)
+    sender = param(params, 'sender')
+    counts = thread.datasets[level].by_sender()
+    counts = counts[counts['type'] == word_type]
+    if sender is not None:
+        counts = counts[counts[config.SENDER_COLUMN_NAME] == sender]
+    totals = counts.groupby('word')['n_w'].sum().nlargest(param(params, 'top', 20, int))
+    return [{'word': word, 'n_w': n_w} for word, n_w in totals.items()]
+
+def top_emoji(thread, params):
+    return top_words(thread, dict(params, level=['words']), word_type='emoji')
+
+def hours(thread, params):
+    messages = thread.datasets['messages']
+    sender = param(params, 'sender')
+    if sender is not None:
+        messages = messages[messages[config.SENDER_COLUMN_NAME] == sender]
+    counts = messages.groupby([messages['datetime'].dt.hour.rename('hour'), config.SENDER_COLUMN_NAME]).size()
+    return [{'hour': hour, 'sender': name, 'messages': n} for (hour, name), n in counts.items()]
+
+def distinguishing(thread, params):
+    level = param(params, 'level', 'words', choices=corpus.LEVELS)
+    group = param(params, 'group', 'sender', choices=['sender', 'term'])
+    column = config.SENDER_COLUMN_NAME if group == 'sender' else 'term'
+    words = thread.datasets[level].distinguishing(group)
+    return [
+        {'group': row[column], 'word': row['word'], 'n_w': row['n_w'], 'tf_idf': row['tf_idf']}
+        for row in words[[column, 'word', 'n_w', 'tf_idf']].to_dict('records')
+    ]
+
+def trend(thread, params):
+    import trends
+    # each word once, as the series has a column per word
+    words = list(dict.fromkeys(w for w in param(params, 'words', '').split(',') if len(w) > 0))
+    series = thread.datasets['trends'].series(words, param(params, 'bucket', 'month', choices=trends.BUCKETS))
+    return {'buckets': series.index.tolist(), 'counts': {word: series[word].tolist() for word in words}}
+
+def movers(thread, params):
+    import trends
+    bucket = param(params, 'bucket', 'month', choices=trends.BUCKETS)
+    direction = param(params, 'direction', 'rising', choices=['rising', 'falling'])
+    return thread.datasets['trends'].grouped(bucket, direction).to_dict('records')
+
+def graph_list(thread, params):
+    import chatstats
+    return [
+        {
+            'title': grapher.graph_title(),
+            'url': "/threads/{}/graphs/{}".format(thread.thread_path, grapher.output_name()),
+        }
+        for grapher, dataset in chatstats.graph_tasks()
+    ]
+
+ENDPOINTS = {
+    'summary': summary,
+    'words': top_words,
+    'emoji': top_emoji,
+    'hours': hours,
+    'tfidf': distinguishing,
+    'trends': trend,
+    'movers': movers,
+    'graphs': graph_list,
+}
+
+def saved_graphs(output_folder, graph_format):
+    '''
+    Returns the sink holding the graphs chatstats.py or batch.py saved for a
+    conversation, as files or in an archive
+    '''
+    archive = os.path.exists(os.path.join(output_folder, sinks.ARCHIVE_FILE))
+    return sinks.open_sink(output_folder, graph_format, archive)
+
+def draw(thread, file_name, facebook_folder):
+    '''
+    Returns the content type and content of a graph, drawn in memory if its
+    data changed since it was saved
+    '''
+    import chatstats
+    import render
+    graph_format = file_name.rpartition('.')[2]
+    if graph_format in sinks.FORMATS:
+        for grapher, dataset in chatstats.graph_tasks():
+            if grapher.output_name(graph_format) != file_name:
+                continue
+            content = render.render_graph(
+                grapher,
+                dataset,
+                thread.datasets,
+                sinks.MemorySink(graph_format),
+                facebook_folder,
+                saved=saved_graphs(thread.output_folder, graph_format)
+            )
+            if content is None:
+                raise NotFound("there is nothing to graph for {}".format(grapher.graph_title()))
+            return sinks.FORMATS[graph_format], content
+    raise NotFound("{} is not a graph".format(file_name))
+
+def to_json(value):
+    '''
+    Converts the numpy numbers and dates found in dataframes for json.dumps
+    '''
+    if hasattr(value, 'item'):
+        return value.item()
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError("{} is not serializable".format(type(value).__name__))
+
+class Handler(BaseHTTPRequestHandler):
+    # set by serve
+    threads = None
+    facebook_folder = None
+
+    def answer(self, parts, params):
+        '''
+        Returns the content type and body answering a request path
+        '''
+        if parts == ['threads']:
+            return 'application/json', cached_threads()
+        if len(parts) >= 4 and parts[0] == 'threads' and parts[-2] == 'graphs':
+            thread = self.threads.get('/'.join(parts[1:-2]))
+            return thread.answer(('graph', parts[-1]), lambda: draw(thread, parts[-1], self.facebook_folder))
+        if len(parts) >= 3 and parts[0] == 'threads' and parts[-1] in ENDPOINTS:
+            thread = self.threads.get('/'.join(parts[1:-1]))
+            key = (parts[-1], tuple(sorted((k, tuple(v)) for k, v in params.items())))
+            return 'application/json', thread.answer(key, lambda: ENDPOINTS[parts[-1]](thread, params))
+        raise NotFound("{} is not a known request".format('/' + '/'.join(parts)))
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parts = [unquote(part) for part in url.path.split('/') if len(part) > 0]
+        try:
+            content_type, body = self.answer(parts, parse_qs(url.query))
+            status = 200
+        except NotFound as e:
+            content_type, body, status = 'application/json', {'error': str(e)}, 404
+        except ValueError as e:
+            content_type, body, status = 'application/json', {'error': str(e)}, 400
+        except Exception:
+            traceback.print_exc()
+            content_type, body, status = 'application/json', {'error': "internal error"}, 500
+
+        # graphs arrive already encoded
+        if not isinstance(body, bytes):
+            body = json.dumps(body, default=to_json).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def serve(port=config.SERVER_PORT, limit=config.SERVER_THREADS, facebook_folder='.'):
+    '''
+    Answers requests one at a time until interrupted, as pyplot can only draw
+    one graph at a time
+    '''
+    import matplotlib
+    matplotlib.use('Agg')
+    import assets
+    assets.save_stickers = False
+    Handler.threads = Threads(limit)
+    Handler.facebook_folder = facebook_folder
+    server = HTTPServer(('localhost', port), Handler)
+    print("Serving {} conversations on http://localhost:{}/threads".format(len(cached_threads()), port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog=argv[0], description="Serve the statistics of processed conversations")
+    parser.add_argument('--port', type=int, default=config.SERVER_PORT, help="port to listen on")
+    parser.add_argument(
+        '--threads',
+        type=int,
+        default=config.SERVER_THREADS,
+        help="number of conversations kept in memory"
+    )
+    parser.add_argument(
+        '--facebook-folder',
+        default='.',
+        help="folder of your Facebook data, containing messages/, used to draw stickers"
+    )
+    return parser.parse_args(argv[1:])
+
+def main(argv):
+    args = parse_args(argv)
+    serve(args.port, args.threads, args.facebook_folder)
+
+if __name__ == "__main__":
+    main(sys.argv)
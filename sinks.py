@@ -0,0 +1,130 @@
+'''
+Sinks receive the graphs of a run, as the bytes of each graph under its file name
+
+Graphers draw into memory and hand the result to a sink, which keeps them in a
+folder, a single zip archive or memory, from which the server answers requests
+'''
+
+import os
+import zipfile
+
+import config
+
+# content type of each format graphs can be drawn in
+FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+    'json': 'application/json',
+}
+
+ARCHIVE_FILE = "graphs.zip"
+
+class Sink(object):
+    '''
+    Interface for sinks, which store graphs drawn in one format
+    '''
+    def __init__(self, graph_format=config.GRAPH_FORMAT):
+        if graph_format not in FORMATS:
+            raise ValueError("graph format must be one of {}".format(", ".join(FORMATS)))
+        self.format = graph_format
+
+    def write(self, name, content):
+        raise NotImplementedError("Implement the write function for a concrete Sink")
+
+    # the content stored under name, or None
+    def read(self, name):
+        raise NotImplementedError("Implement the read function for a concrete Sink")
+
+    def remove(self, name):
+        raise NotImplementedError("Implement the remove function for a concrete Sink")
+
+    def exists(self, name):
+        return self.read(name) is not None
+
+    # saves what was written, for sinks that do not write straight away
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class FolderSink(Sink):
+    '''
+    Saves each graph as a file in a folder
+    '''
+    def __init__(self, folder, graph_format=config.GRAPH_FORMAT):
+        super().__init__(graph_format)
+        self.folder = folder
+
+    def write(self, name, content):
+        with open(os.path.join(self.folder, name), 'wb') as f:
+            f.write(content)
+
+    def read(self, name):
+        try:
+            with open(os.path.join(self.folder, name), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def remove(self, name):
+        if os.path.exists(os.path.join(self.folder, name)):
+            os.remove(os.path.join(self.folder, name))
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(self.folder, name))
+
+class MemorySink(Sink):
+    '''
+    Keeps graphs in memory in files, a dict of each graph's content by name
+    '''
+    def __init__(self, graph_format=config.GRAPH_FORMAT):
+        super().__init__(graph_format)
+        self.files = dict()
+
+    def write(self, name, content):
+        self.files[name] = content
+
+    def read(self, name):
+        return self.files.get(name)
+
+    def remove(self, name):
+        self.files.pop(name, None)
+
+class ZipSink(MemorySink):
+    '''
+    Keeps every graph in one zip archive, read when the sink is created and
+    written once when it is closed if anything changed
+    '''
+    def __init__(self, path, graph_format=config.GRAPH_FORMAT):
+        super().__init__(graph_format)
+        self.path = path
+        if os.path.exists(path):
+            with zipfile.ZipFile(path) as archive:
+                self.files = {name: archive.read(name) for name in archive.namelist()}
+        # what the archive holds, so an unchanged archive is not written again
+        self.archived = dict(self.files)
+
+    def close(self):
+        if self.files == self.archived:
+            return
+        # written beside the archive and moved over it, so a failed write keeps the old one
+        temporary = self.path + ".tmp"
+        with zipfile.ZipFile(temporary, 'w') as archive:
+            for name in sorted(self.files):
+                # pngs are already compressed
+                compression = zipfile.ZIP_STORED if name.endswith('.png') else zipfile.ZIP_DEFLATED
+                archive.writestr(name, self.files[name], compress_type=compression)
+        os.replace(temporary, self.path)
+        self.archived = dict(self.files)
+
+def open_sink(output_folder, graph_format=config.GRAPH_FORMAT, archive=config.ARCHIVE_GRAPHS):
+    '''
+    Returns the sink that keeps the graphs of a thread's output folder
+    '''
+    if archive:
+        return ZipSink(os.path.join(output_folder, ARCHIVE_FILE), graph_format)
+    return FolderSink(output_folder, graph_format)
@@ -0,0 +1,127 @@
+'''
+Synthetic writes Facebook Messenger exports of any size, for benchmarks
+
+Exports are laid out like Facebook's: shards named message_N.json with the
+newest messages in message_1.json, newest first within each shard, and text
+mis-encoded the way Facebook writes it, as utf-8 bytes read as latin-1
+'''
+
+import os
+import json
+import random
+
+FIRST_NAMES = ["Alice", "Bob", "Carol", "Dan", "Erin", "Frank", "Grace", "Heidi", "Ivan", "Judy"]
+LAST_NAMES = ["Smith", "Jones", "White", "Brown", "Lee", "Garcia", "Chen", "Martin"]
+
+WORDS = [
+    "hello", "world", "lol", "Hey!", "what", "are", "you", "doing", "today?",
+    "the", "a", "to", "and", "Let's", "go", "ok...", "haha", "--", "café",
+    "really", "see", "tomorrow", "night", "good", "morning", "it's", "fine",
+]
+
+# text emoticons Facebook converts and emoji of one or several code points
+EMOJI = [
+    ":)", ":P", "<3", ";)", "\U0001f602", "❤", "❤️", "\U0001f44d\U0001f3fd",
+    "\U0001f1e8\U0001f1e6", "\U0001f468‍\U0001f469‍\U0001f467", "nice\U0001f602",
+]
+
+HASHTAGS = ["#tbt", "#1", "#mondays", "#blessed", "#nofilter"]
+
+STICKERS = ["messages/stickers_used/sticker_{}.png".format(i) for i in range(20)]
+
+# templates of each system message type, formatted with a sender's name
+SYSTEM_MESSAGES = {
+    'Game': ["{} scored 12 points playing Snake.", "{} is now in first place in Words."],
+    'Plan Update': ["{} started a plan.", "{} named the plan Dinner."],
+    'Chat Update': ["{} set the emoji to \U0001f602.", "{} changed the chat colors."],
+    'Call Update': ["You and {} can now see each other."],
+}
+
+# share of all messages that are each system message type
+SYSTEM_MIX = {'Game': 0.01, 'Plan Update': 0.002, 'Chat Update': 0.005, 'Call Update': 0.003}
+
+# messages per shard in Facebook's exports
+SHARD_SIZE = 10000
+
+def sender_names(n):
+    return [
+        "{} {}".format(FIRST_NAMES[i % len(FIRST_NAMES)], LAST_NAMES[i // len(FIRST_NAMES) % len(LAST_NAMES)])
+        for i in range(n)
+    ]
+
+def facebook_encoding(text):
+    return text.encode('utf-8').decode('latin-1')
+
+def generate_messages(n, senders=4, emoji=0.05, stickers=0.02, hashtags=0.01, system_mix=SYSTEM_MIX,
+        words_per_message=(1, 15), seed=0):
+    '''
+    Yields n messages shaped like an export's, newest first
+
+    emoji and hashtags are the share of words that are emoji or hashtags,
+    stickers and the values of system_mix are shares of messages
+    '''
+    rng = random.Random(seed)
+    names = sender_names(senders)
+    system_types = list(system_mix)
+    # message kinds picked by a uniform draw below each cumulative share
+    bounds = list()
+    total = stickers
+    bounds.append((total, 'sticker'))
+    for system_type in system_types:
+        total += system_mix[system_type]
+        bounds.append((total, system_type))
+
+    timestamp = 1546300800000
+    for _ in range(n):
+        timestamp -= rng.randint(1000, 3600000)
+        sender = rng.choice(names)
+        message = {'sender_name': facebook_encoding(sender), 'timestamp_ms': timestamp, 'type': 'Generic'}
+
+        draw = rng.random()
+        kind = next((k for bound, k in bounds if draw < bound), 'text')
+        if kind == 'sticker':
+            message['sticker'] = {'uri': rng.choice(STICKERS)}
+        elif kind != 'text':
+            template = rng.choice(SYSTEM_MESSAGES[kind])
+            message['content'] = facebook_encoding(template.format(rng.choice(names)))
+        else:
+            words = list()
+            for _ in range(rng.randint(*words_per_message)):
+                word_draw = rng.random()
+                if word_draw < emoji:
+                    words.append(rng.choice(EMOJI))
+                elif word_draw < emoji + hashtags:
+                    words.append(rng.choice(HASHTAGS))
+                else:
+                    words.append(rng.choice(WORDS))
+            message['content'] = facebook_encoding(" ".join(words))
+        yield message
+
+def write_export(chat_folder, n, shards=None, senders=4, **kwargs):
+    '''
+    Writes an export of n messages split into shards, by default as many as
+    Facebook would use, and returns its chat folder
+
+    Other arguments are passed to generate_messages
+    '''
+    if not os.path.exists(chat_folder):
+        os.makedirs(chat_folder)
+    shards = shards or max(1, -(-n // SHARD_SIZE))
+    shard_size = -(-n // shards)
+
+    metadata = {
+        'participants': [{'name': facebook_encoding(name)} for name in sender_names(senders)],
+        'title': "Benchmark",
+        'is_still_participant': True,
+        'thread_type': 'RegularGroup',
+        'thread_path': "inbox/{}".format(os.path.basename(os.path.normpath(chat_folder))),
+    }
+
+    messages = generate_messages(n, senders=senders, **kwargs)
+    for shard in range(shards):
+        shard_messages = [message for _, message in zip(range(shard_size), messages)]
+        if len(shard_messages) == 0:
+            break
+        with open(os.path.join(chat_folder, "message_{}.json".format(shard + 1)), 'w') as f:
+            json.dump(dict(metadata, messages=shard_messages), f)
+    return chat_folder
@@ -0,0 +1,19 @@
+'''
+Tests for batch.py, run with python3 -m pytest
+'''
+
+import os
+import json
+
+import batch
+
+def test_empty_thread_is_not_failed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    chat_folder = os.path.join("messages", "inbox", "ghost_abc123") + os.sep
+    os.makedirs(chat_folder)
+    for shard in (1, 2):
+        with open(os.path.join(chat_folder, "message_{}.json".format(shard)), 'w') as f:
+            json.dump({'participants': [{'name': "Ghost"}], 'title': "Ghost", 'messages': []}, f)
+
+    summary = batch.graph_thread(chat_folder, True, False, 'json', False)
+    assert summary == {'thread_path': "inbox/ghost_abc123", 'empty': True}
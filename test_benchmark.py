@@ -0,0 +1,14 @@
+'''
+Tests for benchmark.py, run with python3 -m pytest
+'''
+
+import os
+
+import benchmark
+
+def test_suite_smallest_size(tmp_path, capsys):
+    baseline = os.path.join(str(tmp_path), "baseline.json")
+    benchmark.main(['benchmark.py', '--suite', '--sizes', '500', '--baseline', baseline])
+    out = capsys.readouterr().out
+    assert "suite (500 messages)" in out
+    assert "graphers" in out
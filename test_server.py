@@ -0,0 +1,83 @@
+'''
+Tests for server.py, run with python3 -m pytest
+'''
+
+import os
+import json
+import threading
+from http.server import HTTPServer
+from urllib.request import urlopen
+
+import cache
+import chatstats
+import server
+import synthetic
+
+THREAD_PATH = "inbox/benchmark"
+
+def save_thread(folder, n=200, seed=0):
+    '''
+    Caches a small generated conversation in folder/my_data, as chatstats.py
+    would
+    '''
+    chat_folder = synthetic.write_export(os.path.join(folder, "messages", THREAD_PATH), n, seed=seed)
+    key = cache.fingerprint(chat_folder)
+    cache.save(os.path.join(folder, server.DATA_FOLDER, THREAD_PATH), key, *chatstats.process_thread(chat_folder, 1))
+
+def serve_once(monkeypatch, threads, path):
+    '''
+    Answers one request to path with a Handler using threads
+    '''
+    monkeypatch.setattr(server.Handler, 'threads', threads)
+    monkeypatch.setattr(server.Handler, 'facebook_folder', '.')
+    http = HTTPServer(('localhost', 0), server.Handler)
+    thread = threading.Thread(target=http.handle_request)
+    thread.start()
+    try:
+        with urlopen("http://localhost:{}{}".format(http.server_port, path)) as response:
+            return json.loads(response.read().decode('utf-8'))
+    finally:
+        thread.join()
+        http.server_close()
+
+def test_summary_endpoint(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    save_thread(str(tmp_path))
+    threads = server.Threads()
+
+    answer = serve_once(monkeypatch, threads, "/threads/{}/summary".format(THREAD_PATH))
+    assert answer['thread_path'] == THREAD_PATH
+    assert answer['messages'] > 0
+    assert serve_once(monkeypatch, threads, "/threads") == [{'thread_path': THREAD_PATH, 'messages': answer['messages']}]
+
+def test_trend_repeated_words(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    save_thread(str(tmp_path))
+    threads = server.Threads()
+
+    once = serve_once(monkeypatch, threads, "/threads/{}/trends?words=lol".format(THREAD_PATH))
+    repeated = serve_once(monkeypatch, threads, "/threads/{}/trends?words=lol,lol".format(THREAD_PATH))
+    assert list(repeated['counts']) == ['lol']
+    assert repeated == once
+
+def test_processed_again_is_reloaded(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    save_thread(str(tmp_path), n=200)
+    threads = server.Threads()
+    thread = threads.get(THREAD_PATH)
+    assert threads.get(THREAD_PATH) is thread
+
+    save_thread(str(tmp_path), n=300, seed=1)
+    reloaded = threads.get(THREAD_PATH)
+    assert reloaded is not thread
+    assert len(reloaded.datasets['messages']) > len(thread.datasets['messages'])
+
+def test_answers_drop_least_recently_used(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    save_thread(str(tmp_path))
+    threads = server.Threads(answers=2)
+
+    for top in (1, 2, 1, 3):
+        serve_once(monkeypatch, threads, "/threads/{}/words?top={}".format(THREAD_PATH, top))
+    answers = threads.get(THREAD_PATH).answers
+    assert [dict(key[1]) for key in answers] == [{'top': ('1',)}, {'top': ('3',)}]
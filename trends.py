@@ -0,0 +1,242 @@
+'''
+Trends follow how often words are used over time
+
+Word counts are summed per day when a thread is processed and cached with the
+other tables. TrendIndex holds them as a sparse word by day matrix and sums
+its columns into weeks, months or terms the first time each is asked for, so
+questions like the use of a word each month or the words that rose the most
+each month never regroup the messages
+'''
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+import config
+import util
+
+BUCKETS = ['day', 'week', 'month', 'term']
+
+# pandas period of each bucket, terms are numbered by hand
+PERIOD_FREQUENCIES = {'day': 'D', 'week': 'W-SUN', 'month': 'M'}
+
+# words ranked by the rising and falling words of each bucket
+TREND_TYPES = ['word']
+TREND_TOP_K = 10
+
+# a word must be used this many times in a bucket to rise into it or fall out of it
+TREND_MIN_COUNT = 5
+
+# a bucket's share of each word is blended with the word's share of the whole
+# chat as if the bucket had this many more words, so words in a nearly empty
+# bucket do not all look new in the next one
+TREND_PRIOR_WORDS = 1000
+
+# words drawn by the rising words graph
+TREND_GRAPH_WORDS = 5
+
+DAILY_COLUMNS = ['day', 'type', 'word']
+
+def daily_counts(ngrams, messages):
+    '''
+    Sums the per-message counts from word_data per day, in config.TIMEZONE
+
+    type and word stay categoricals
+    '''
+    days = messages['datetime'].dt.tz_localize(None).dt.normalize().to_numpy()
+    daily = ngrams[['type', 'word', 'n_w']].reset_index(drop=True)
+    daily.insert(0, 'day', days[ngrams['message_id'].to_numpy()])
+    return daily.groupby(DAILY_COLUMNS, as_index=False, observed=True)[['n_w']].sum()
+
+def merge_daily_counts(counts):
+    '''
+    Adds a list of counts from daily_counts together, grouping them once
+    '''
+    merged = pd.DataFrame({
+        column: union_categoricals([daily[column] for daily in counts], sort_categories=True)
+        for column in ['type', 'word']
+    })
+    merged['day'] = np.concatenate([daily['day'].to_numpy() for daily in counts])
+    merged['n_w'] = np.concatenate([daily['n_w'].to_numpy() for daily in counts])
+    return merged.groupby(DAILY_COLUMNS, as_index=False, observed=True)[['n_w']].sum()
+
+def bucket_days(days, bucket):
+    '''
+    Returns the bucket number of each day, counted from the bucket of the first
+    day, and the label of every bucket up to the last day, including empty ones
+    '''
+    days = pd.DatetimeIndex(days)
+    if bucket == 'term':
+        term_length = 12 // config.TERMS_PER_YEAR
+        terms = np.asarray(days.year * config.TERMS_PER_YEAR + (days.month - 1) // term_length)
+        first = terms.min()
+        labels = [
+            "{} {}".format(term // config.TERMS_PER_YEAR, util.to_term(term % config.TERMS_PER_YEAR * term_length + 1))
+            for term in range(first, terms.max() + 1)
+        ]
+        return terms - first, labels
+
+    periods = days.to_period(PERIOD_FREQUENCIES[bucket])
+    every_period = pd.period_range(periods.min(), periods.max(), freq=PERIOD_FREQUENCIES[bucket])
+    label_format = '%Y-%m' if bucket == 'month' else '%Y-%m-%d'
+    return every_period.get_indexer(periods), list(every_period.start_time.strftime(label_format))
+
+class TrendIndex(object):
+    '''
+    Word counts per day from daily_counts, as a sparse matrix with a row per
+    word, remembering the matrix of each bucket and each grouping once computed
+    '''
+    def __init__(self, daily):
+        self.daily = daily
+        self.matrices = {}
+        self.groups = {}
+        # the word of each row, and the rows of each type, set with the day matrix
+        self.vocabulary = None
+        self.type_rows = None
+
+    def day_matrix(self):
+        '''
+        Returns the word by day matrix and the label of each day, built on first use
+        '''
+        if 'day' in self.matrices:
+            return self.matrices['day']
+
+        from scipy import sparse
+        words = self.daily['word'].astype('category').cat
+        word_codes = words.codes.to_numpy()
+        if len(self.daily) > 0:
+            day_codes, days = bucket_days(self.daily['day'].to_numpy(), 'day')
+        else:
+            day_codes, days = word_codes, []
+
+        self.vocabulary = pd.Index(words.categories.astype(str))
+        types = self.daily['type'].astype('category').cat
+        type_codes = types.codes.to_numpy()
+        self.type_rows = {
+            word_type: np.unique(word_codes[type_codes == i])
+            for i, word_type in enumerate(types.categories.astype(str))
+        }
+        self.matrices['day'] = (
+            sparse.csr_matrix(
+                (self.daily['n_w'].to_numpy(), (word_codes, day_codes)),
+                shape=(len(self.vocabulary), len(days))
+            ),
+            days
+        )
+        return self.matrices['day']
+
+    def counts(self, bucket):
+        '''
+        Returns the word by bucket count matrix and the label of each bucket
+        '''
+        if bucket not in BUCKETS:
+            raise ValueError("bucket must be one of {}".format(", ".join(BUCKETS)))
+        if bucket in self.matrices:
+            return self.matrices[bucket]
+
+        from scipy import sparse
+        matrix, days = self.day_matrix()
+        if len(days) == 0:
+            return matrix, days
+        day_buckets, labels = bucket_days(days, bucket)
+        # each day's column is added into the column of its bucket
+        to_buckets = sparse.csr_matrix(
+            (np.ones(len(days), dtype=np.int64), (np.arange(len(days)), day_buckets)),
+            shape=(len(days), len(labels))
+        )
+        self.matrices[bucket] = (matrix @ to_buckets).tocsr(), labels
+        return self.matrices[bucket]
+
+    def series(self, words, bucket='month'):
+        '''
+        Returns a dataframe of how many times each word was used in each
+        bucket, with a row per bucket and a column per word
+        '''
+        matrix, labels = self.counts(bucket)
+        rows = self.vocabulary.get_indexer(list(words))
+        values = np.zeros((len(labels), len(rows)), dtype=np.int64)
+        found = rows >= 0
+        values[:, found] = matrix[rows[found]].toarray().T
+        return pd.DataFrame(values, index=labels, columns=list(words))
+
+    def movers(self, bucket='month', k=TREND_TOP_K, rising=True, types=TREND_TYPES, min_count=TREND_MIN_COUNT):
+        '''
+        Returns the k words of each bucket whose use rose (or fell) the most
+        from the previous bucket, sorted by bucket and then by change
+
+        change is the count in the bucket minus the count expected from the
+        word's share of the previous bucket, blended with its share of the
+        whole chat by TREND_PRIOR_WORDS. Buckets next to an empty bucket are
+        not ranked
+        '''
+        columns = ['bucket', 'word', 'previous', 'n_w', 'change']
+        matrix, labels = self.counts(bucket)
+        if len(labels) < 2:
+            return pd.DataFrame(columns=columns)
+
+        totals = np.asarray(matrix.sum(axis=0)).ravel()
+        shares = np.asarray(matrix.sum(axis=1)).ravel() / totals.sum()
+        previous = matrix[:, :-1]
+        current = matrix[:, 1:]
+
+        # words rise into a bucket they are used in, and fall from one they were used in
+        entries = (current if rising else previous).tocoo()
+        rows, cols = entries.row, entries.col
+        eligible = (entries.data >= min_count) & (totals[:-1][cols] > 0) & (totals[1:][cols] > 0)
+        if types is not None:
+            eligible &= np.isin(rows, np.concatenate([self.type_rows.get(t, []) for t in types]).astype(int))
+        rows, cols = rows[eligible], cols[eligible]
+
+        previous_counts = np.asarray(previous[rows, cols]).ravel()
+        current_counts = np.asarray(current[rows, cols]).ravel()
+        expected = totals[1:][cols] * (previous_counts + TREND_PRIOR_WORDS * shares[rows]) / \
+            (totals[:-1][cols] + TREND_PRIOR_WORDS)
+        scores = current_counts - expected
+        signed = scores if rising else -scores
+
+        candidates = np.flatnonzero(signed > 0)
+        candidates = candidates[np.argsort(cols[candidates], kind='stable')]
+        bounds = np.searchsorted(cols[candidates], np.arange(len(labels)))
+
+        top = list()
+        for b in range(len(labels) - 1):
+            group = candidates[bounds[b]:bounds[b + 1]]
+            if len(group) > k:
+                group = group[np.argpartition(-signed[group], k - 1)[:k]]
+            top.append(group[np.argsort(-signed[group], kind='stable')])
+        top = np.concatenate(top)
+
+        return pd.DataFrame({
+            'bucket': np.asarray(labels, dtype=object)[cols[top] + 1],
+            'word': np.asarray(self.vocabulary, dtype=object)[rows[top]],
+            'previous': previous_counts[top],
+            'n_w': current_counts[top],
+            'change': scores[top],
+        }, columns=columns)
+
+    def grouped(self, bucket, kind='counts'):
+        '''
+        Returns a dataframe of the counts per bucket, as graphers read them
+
+        kind is 'counts' for a row per word and bucket it was used in, or
+        'rising' or 'falling' for the movers of each bucket
+        '''
+        key = (bucket, kind)
+        if key in self.groups:
+            return self.groups[key]
+
+        if kind == 'counts':
+            matrix, labels = self.counts(bucket)
+            coo = matrix.tocoo()
+            result = pd.DataFrame({
+                'bucket': pd.Categorical.from_codes(coo.col, labels),
+                'word': np.asarray(self.vocabulary, dtype=object)[coo.row],
+                'n_w': coo.data,
+            })
+        elif kind in ('rising', 'falling'):
+            result = self.movers(bucket, rising=kind == 'rising')
+        else:
+            raise ValueError("kind must be 'counts', 'rising' or 'falling'")
+
+        self.groups[key] = result
+        return result
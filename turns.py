@@ -0,0 +1,157 @@
+'''
+Turns analyses how people take turns talking: how long each sender takes to
+reply, who replies to whom, and the conversations a chat is split into by
+long silences
+
+Everything is computed on numpy arrays of the messages sorted by time, so
+threads of millions of messages take a few seconds
+'''
+
+import numpy as np
+import pandas as pd
+
+import classifier
+import config
+
+def sorted_turns(messages):
+    '''
+    Returns the timestamps and sender codes of the messages people sent,
+    sorted by time, and the sender name of each code
+    '''
+    sent = messages[~messages['type'].isin(classifier.system_types()).to_numpy()]
+    timestamps = sent['timestamp_ms'].to_numpy(dtype=np.int64)
+    senders, names = pd.factorize(sent[config.SENDER_COLUMN_NAME])
+
+    # exports are newest first, so reversing them is usually enough
+    if len(timestamps) > 1 and timestamps[0] > timestamps[-1]:
+        timestamps = timestamps[::-1]
+        senders = senders[::-1]
+    if np.any(timestamps[1:] < timestamps[:-1]):
+        order = np.argsort(timestamps, kind='stable')
+        timestamps = timestamps[order]
+        senders = senders[order]
+    return timestamps, senders, np.asarray(names)
+
+def session_starts(timestamps, gap_minutes):
+    '''
+    Returns whether each message starts a new conversation, which it does
+    when nobody wrote for more than gap_minutes before it
+    '''
+    starts = np.empty(len(timestamps), dtype=bool)
+    starts[:1] = True
+    starts[1:] = np.diff(timestamps) > gap_minutes * 60 * 1000
+    return starts
+
+def reply_positions(timestamps, senders, gap_minutes):
+    '''
+    Returns the position of every message replying to the message before it,
+    which another sender wrote in the same conversation
+    '''
+    is_reply = ~session_starts(timestamps, gap_minutes)
+    is_reply[1:] &= senders[1:] != senders[:-1]
+    return np.flatnonzero(is_reply)
+
+def replies(messages, gap_minutes=config.SESSION_GAP_MINUTES):
+    '''
+    Returns a dataframe of every reply with its sender, who they replied to
+    and how many seconds they took
+    '''
+    timestamps, senders, names = sorted_turns(messages)
+    index = reply_positions(timestamps, senders, gap_minutes)
+
+    return pd.DataFrame({
+        'sender': pd.Categorical.from_codes(senders[index], names),
+        'replied_to': pd.Categorical.from_codes(senders[index - 1], names),
+        'seconds': (timestamps[index] - timestamps[index - 1]) / 1000,
+    })
+
+def reply_matrix(messages, gap_minutes=config.SESSION_GAP_MINUTES):
+    '''
+    Returns a dataframe counting the replies of each sender (rows) to each
+    other sender (columns)
+    '''
+    return count_replies(replies(messages, gap_minutes))
+
+def count_replies(replies):
+    '''
+    Returns the reply_matrix of a replies dataframe
+    '''
+    names = np.asarray(replies['sender'].cat.categories)
+    n = len(names)
+    codes = replies['sender'].cat.codes.to_numpy(dtype=np.int64) * n + replies['replied_to'].cat.codes.to_numpy()
+    counts = np.bincount(codes, minlength=n * n).reshape(n, n)
+    return pd.DataFrame(counts, index=names, columns=names)
+
+def sessions(messages, gap_minutes=config.SESSION_GAP_MINUTES):
+    '''
+    Returns a dataframe of every conversation, with when it started and
+    ended, who started it, and how many messages and senders it had
+    '''
+    timestamps, senders, names = sorted_turns(messages)
+
+    starts = np.flatnonzero(session_starts(timestamps, gap_minutes))
+    ends = np.append(starts[1:], len(timestamps))
+    session_ids = np.repeat(np.arange(len(starts)), ends - starts)
+
+    # distinct (session, sender) pairs give the number of senders in each session
+    pairs = np.unique(session_ids * max(len(names), 1) + senders)
+    participants = np.bincount(pairs // max(len(names), 1), minlength=len(starts))
+
+    return pd.DataFrame({
+        'start_ms': timestamps[starts],
+        'end_ms': timestamps[ends - 1],
+        'starter': names[senders[starts]],
+        'messages': ends - starts,
+        'senders': participants,
+    })
+
+class TurnData(object):
+    '''
+    The replies and conversations of a thread's messages, computed once in
+    one pass, remembering each grouping of them once computed so graphers
+    and their is_empty checks share it
+    '''
+    def __init__(self, messages, gap_minutes=config.SESSION_GAP_MINUTES):
+        self.messages = messages
+        self.gap_minutes = gap_minutes
+        self.groups = {}
+        # set on first use
+        self.reply_rows = None
+        self.session_rows = None
+
+    def replies(self):
+        if self.reply_rows is None:
+            self.reply_rows = replies(self.messages, self.gap_minutes)
+        return self.reply_rows
+
+    def sessions(self):
+        if self.session_rows is None:
+            self.session_rows = sessions(self.messages, self.gap_minutes)
+        return self.session_rows
+
+    def grouped(self, group, kind):
+        '''
+        Returns a dataframe of the turns of each sender, as graphers read them
+
+        kind is 'response_time' for the median minutes each sender takes to
+        reply, 'replies' for the reply_matrix, or 'starters' for the number
+        of conversations each sender started
+        '''
+        key = (group, kind)
+        if key in self.groups:
+            return self.groups[key]
+
+        if group != 'sender':
+            raise ValueError("group must be 'sender'")
+        elif kind == 'response_time':
+            result = (self.replies().groupby('sender', observed=True)['seconds'].median() / 60).sort_values()
+            result = result.reset_index(name='minutes')
+        elif kind == 'replies':
+            result = count_replies(self.replies())
+        elif kind == 'starters':
+            result = self.sessions()['starter'].value_counts().rename_axis('sender').reset_index(name='conversations')
+        else:
+            raise ValueError("kind must be 'response_time', 'replies' or 'starters'")
+
+        self.groups[key] = result
+        return result
@@ -2,21 +2,13 @@
 Util functions shared between different modules
 '''
 
-import matplotlib.font_manager as font_manager
 import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
 import math
 import string
 import config
 
-def add_custom_fonts():
-    '''
-    Allow us to use fonts from our fonts folder
-    '''
-    font_dirs = ['fonts']
-    font_files = font_manager.findSystemFonts(fontpaths=font_dirs)
-    font_list = font_manager.createFontList(font_files)
-    font_manager.fontManager.ttflist.extend(font_list)
-
 def get_rows_cols(n):
     rows = math.floor(math.sqrt(n))
     while(n % rows != 0):
@@ -24,21 +16,139 @@ def get_rows_cols(n):
     cols = int(n / rows)
     return rows, cols
 
-def tf_idf(words, group):
+def corpus_idf(words, document_frequencies):
+    '''
+    Returns the i_d and idf of each word against other documents, from the
+    (number of documents, documents per word) pair corpus.document_frequencies
+    returns. Words not in those documents count as appearing in one
+    '''
+    documents, frequencies = document_frequencies
+    i_d = frequencies.reindex(words).fillna(1).clip(lower=1).to_numpy().astype(np.int64)
+    return i_d, np.log(documents / i_d)
+
+def tf_idf(words, group, document_frequencies=None):
+    '''
+    Scores each word by its frequency in its group times its inverse document
+    frequency, where the documents are the groups unless document_frequencies
+    from corpus.document_frequencies is given
+    '''
     groups = words.groupby([group], as_index=False)[['n_w']].sum().rename(columns={'n_w': 'n_d'})
     tf = words.merge(groups, on=group, how="left")
     tf['tf'] = tf.n_w/tf.n_d
-    c_d = tf[group].nunique()
-    idf = tf.groupby('word', as_index=False)[[group]].count().rename(columns={group: 'i_d'})
-    idf['idf'] = np.log(c_d/idf.i_d.values)
+    if document_frequencies is None:
+        c_d = tf[group].nunique()
+        idf = tf.groupby('word', as_index=False)[[group]].count().rename(columns={group: 'i_d'})
+        idf['idf'] = np.log(c_d/idf.i_d.values)
+    else:
+        idf = pd.DataFrame({'word': tf['word'].unique()})
+        idf['i_d'], idf['idf'] = corpus_idf(idf['word'], document_frequencies)
     tf_idf = tf.merge(idf, on="word", how="left").rename(columns={'0': 'idf'})
     tf_idf['tf_idf'] = tf_idf.tf * tf_idf.idf
     tf_idf = tf_idf.sort_values('tf_idf', ascending=False)
 
     return tf_idf
 
+# n-gram counts are stored summed over these columns
+NGRAM_AGGREGATE_COLUMNS = ['sender_name', 'sender_first_name', 'term', 'type', 'word']
+
+def aggregate_words(ngrams, messages):
+    '''
+    Sums the per-message counts from word_data per sender and term, which is
+    all the word graphers need
+
+    Every column but n_w is a categorical
+    '''
+    senders = messages[['sender_name', 'sender_first_name', 'term']].iloc[ngrams['message_id'].to_numpy()]
+    words = pd.concat([
+        senders.reset_index(drop=True).astype('category'),
+        ngrams[['type', 'word', 'n_w']].reset_index(drop=True)
+    ], axis=1)
+    return words.groupby(NGRAM_AGGREGATE_COLUMNS, as_index=False, observed=True)[['n_w']].sum()
+
+def merge_word_counts(counts):
+    '''
+    Adds a list of counts from aggregate_words together, grouping them once
+    '''
+    merged = pd.DataFrame({
+        column: union_categoricals([words[column] for words in counts], sort_categories=True)
+        for column in NGRAM_AGGREGATE_COLUMNS
+    })
+    merged['n_w'] = np.concatenate([words['n_w'].to_numpy() for words in counts])
+    return merged.groupby(NGRAM_AGGREGATE_COLUMNS, as_index=False, observed=True)[['n_w']].sum()
+
+def decode_categories(words):
+    '''
+    Turns categorical columns back into strings, as graphers expect
+    '''
+    for column in words.columns:
+        if isinstance(words[column].dtype, pd.CategoricalDtype):
+            words[column] = words[column].astype(str)
+    return words
+
+def top_tf_idf(words, group, k, types=None, min_length=1, document_frequencies=None):
+    '''
+    Returns the k rows with the highest tf-idf in each group, with the same
+    columns as tf_idf, with the groups in order of their highest tf-idf as
+    in tf_idf, and the rows of each group by descending tf-idf
+
+    words must have one row per (group, type, word), like group_words_by_sender
+    returns. Only words of the given types and minimum length are ranked, but
+    every word counts towards the scores. This uses a sparse count matrix and
+    a partial sort per group, so it needs far less memory than tf_idf.
+    document_frequencies works as in tf_idf
+    '''
+    from scipy import sparse
+
+    group_codes, group_names = pd.factorize(words[group])
+    word_codes, word_names = pd.factorize(words['word'])
+    n_w = words['n_w'].to_numpy()
+
+    counts = sparse.csr_matrix(
+        (n_w, (group_codes, word_codes)),
+        shape=(len(group_names), len(word_names))
+    )
+    n_d = np.asarray(counts.sum(axis=1)).ravel()
+    if document_frequencies is None:
+        # number of rows each word appears in, as tf_idf counts them
+        i_d = np.bincount(word_codes, minlength=len(word_names))
+        idf = np.log(len(group_names) / i_d)
+    else:
+        i_d, idf = corpus_idf(word_names, document_frequencies)
+
+    tf = n_w / n_d[group_codes]
+    scores = tf * idf[word_codes]
+
+    eligible = words['word'].str.len().to_numpy() >= min_length
+    if types is not None:
+        eligible &= words['type'].isin(types).to_numpy()
+
+    # rows of each group, without a global sort by score
+    candidates = np.flatnonzero(eligible)
+    candidates = candidates[np.argsort(group_codes[candidates], kind='stable')]
+    bounds = np.searchsorted(group_codes[candidates], np.arange(len(group_names) + 1))
+
+    top_rows = list()
+    for g in range(len(group_names)):
+        rows = candidates[bounds[g]:bounds[g + 1]]
+        if len(rows) > k:
+            rows = rows[np.argpartition(-scores[rows], k - 1)[:k]]
+        if len(rows) > 0:
+            top_rows.append(rows[np.argsort(-scores[rows], kind='stable')])
+    # groups in order of their top score, as tf_idf sorts every row by score
+    top_rows.sort(key=lambda rows: -scores[rows[0]])
+    top_rows = np.concatenate(top_rows) if len(top_rows) > 0 else np.array([], dtype=int)
+
+    result = words.iloc[top_rows].reset_index(drop=True)
+    result['n_d'] = n_d[group_codes[top_rows]]
+    result['tf'] = tf[top_rows]
+    result['i_d'] = i_d[word_codes[top_rows]]
+    result['idf'] = idf[word_codes[top_rows]]
+    result['tf_idf'] = scores[top_rows]
+    return result
+
 def group_words_by_sender(words, get_tfidf=False):
-    words = words.groupby([config.SENDER_COLUMN_NAME, 'type', 'word'], as_index=False)[['n_w']].sum()
+    words = words.groupby([config.SENDER_COLUMN_NAME, 'type', 'word'], as_index=False, observed=True)[['n_w']].sum()
+    words = decode_categories(words)
 
     if not get_tfidf:
         return words
@@ -46,16 +156,91 @@ def group_words_by_sender(words, get_tfidf=False):
     return tf_idf(words, config.SENDER_COLUMN_NAME)
 
 def group_words_by_term(words, get_tfidf=False):
-    words = words.groupby(['term', 'type', 'word'], as_index=False)[['n_w']].sum()
+    words = words.groupby(['term', 'type', 'word'], as_index=False, observed=True)[['n_w']].sum()
+    words = decode_categories(words)
 
     if not get_tfidf:
         return words
 
     return tf_idf(words, 'term')
 
+# words ranked by the distinguishing words graphs
+DISTINGUISHING_TYPES = ['word']
+DISTINGUISHING_MIN_LENGTH = 2
+DISTINGUISHING_TOP_K = 10
+
+class WordData(object):
+    '''
+    Word counts for one n-gram level, as returned by aggregate_words, remembering
+    each grouping once computed so graphers reading the same grouping share it
+
+    Groupings have plain string columns, so graphers never see the categoricals
+    '''
+    def __init__(self, words, document_frequencies=None):
+        self.words = words
+        # scores words against other threads instead of this thread's groups
+        self.document_frequencies = document_frequencies
+        self.groups = {}
+
+    def grouped(self, group, kind='counts'):
+        '''
+        Returns the counts grouped by 'sender' or 'term'
+
+        kind is 'counts' for the summed counts, 'tfidf' to add tf-idf scores
+        to every row, or 'distinguishing' for only the top scoring words of
+        each group
+        '''
+        key = (group, kind)
+        if key in self.groups:
+            return self.groups[key]
+
+        column = config.SENDER_COLUMN_NAME if group == 'sender' else group
+        if group not in ('sender', 'term'):
+            raise ValueError("group must be 'sender' or 'term'")
+        elif kind == 'counts':
+            result = group_words_by_sender(self.words) if group == 'sender' else group_words_by_term(self.words)
+        elif kind == 'tfidf':
+            result = tf_idf(self.grouped(group), column, self.document_frequencies)
+        elif kind == 'distinguishing' and config.TFIDF_ENGINE == 'sparse':
+            result = top_tf_idf(
+                self.grouped(group),
+                column,
+                DISTINGUISHING_TOP_K,
+                types=DISTINGUISHING_TYPES,
+                min_length=DISTINGUISHING_MIN_LENGTH,
+                document_frequencies=self.document_frequencies
+            )
+        elif kind == 'distinguishing':
+            result = self.grouped(group, 'tfidf')
+            result = result[result['word'].str.len() >= DISTINGUISHING_MIN_LENGTH]
+            result = result[result['type'].isin(DISTINGUISHING_TYPES)]
+        else:
+            raise ValueError("kind must be 'counts', 'tfidf' or 'distinguishing'")
+
+        self.groups[key] = result
+        return result
+
+    def by_sender(self, get_tfidf=False):
+        return self.grouped('sender', 'tfidf' if get_tfidf else 'counts')
+
+    def by_term(self, get_tfidf=False):
+        return self.grouped('term', 'tfidf' if get_tfidf else 'counts')
+
+    def distinguishing(self, group):
+        '''
+        Returns the words with the highest tf-idf of each sender or term, best first
+        '''
+        return self.grouped(group, 'distinguishing')
+
 def is_hashtag(word):
     return word.startswith("#") and len(word[1:].strip(string.punctuation)) > 0 and not word[1:].isdigit()
 
+def term_lookup():
+    '''
+    Returns an array of term names indexed by month, for vectorized lookups
+    '''
+    return np.array([None] + [to_term(month) for month in range(1, 13)], dtype=object)
+
 # column name for term
 def to_term(month):
     MONTHS_PER_YEAR = 12